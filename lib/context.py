@@ -1,14 +1,129 @@
 import os
+import socket
 
-from lib.database import DatabasePool
+from lib.database import AsyncDatabasePool, DatabasePool
+from lib.http import HttpSession
 from lib.logging import setup_logger
+from lib.slack_cache import SlackCache
+from lib.slack_dispatcher import SlackDispatcher
 
 class MueckContext:
     def __init__(self):
         self.dbh = DatabasePool()
+        self.async_dbh = AsyncDatabasePool()
         self.logger = setup_logger()
+        self.http_pool_size = int(os.getenv("MUECK_HTTP_POOL_SIZE", "16"))
+        self.http = HttpSession(pool_size=self.http_pool_size)
+
+        # Calls to the Slack Web API are rate limited per workspace and method.
+
+        self.slack_dispatcher = SlackDispatcher(
+            self.logger,
+            threads=int(os.getenv("MUECK_SLACK_DISPATCH_THREADS", "4")),
+        )
+
+        # The webhook buffers verified events in memory and writes them in batches.
+
+        self.event_buffer_size = int(os.getenv("MUECK_EVENT_BUFFER_SIZE", "1000"))
+        self.event_batch_size = int(os.getenv("MUECK_EVENT_BATCH_SIZE", "100"))
+        self.event_flush_ms = int(os.getenv("MUECK_EVENT_FLUSH_MS", "50"))
+        self.event_drain_seconds = int(os.getenv("MUECK_EVENT_DRAIN_SECONDS", "10"))
+
+        self.slack_cache = SlackCache(
+            max_size=int(os.getenv("MUECK_SLACK_CACHE_SIZE", "1024")),
+            ttl=int(os.getenv("MUECK_SLACK_CACHE_TTL_SECONDS", "300")),
+        )
 
         self.listener_hostname = os.getenv("MUECK_LISTENER_HOSTNAME")
+
+        #
+        # Vendors call us back at callback_base_url when a job finishes, if we have
+        # a secret to sign the callback URLs with. Jobs are still polled every
+        # callback_poll_seconds in case a callback never arrives.
+        #
+
+        self.callback_secret = os.getenv("MUECK_CALLBACK_SECRET")
+        self.callback_base_url = os.getenv("MUECK_CALLBACK_BASE_URL")
+
+        if not self.callback_base_url and self.listener_hostname:
+            self.callback_base_url = f"https://{self.listener_hostname}"
+
+        self.callback_poll_seconds = int(os.getenv("MUECK_CALLBACK_POLL_SECONDS", "120"))
         self.tensorart_endpoint = os.getenv("TENSORART_ENDPOINT")
         self.tensorart_api_key = os.getenv("TENSORART_API_KEY")
-        self.download_path = os.getenv("MUECK_DOWNLOAD_PATH")
\ No newline at end of file
+        self.download_path = os.getenv("MUECK_DOWNLOAD_PATH")
+
+        # In pass-through mode images are streamed from the vendor to Slack and never written to disk.
+
+        self.passthrough = os.getenv("MUECK_PASSTHROUGH", "").lower() in ("1", "true", "yes")
+
+        # Least recently used images are deleted to keep the download path within
+        # these budgets. Zero means no limit.
+
+        self.download_max_bytes = int(os.getenv("MUECK_DOWNLOAD_MAX_BYTES", "0"))
+        self.download_max_files = int(os.getenv("MUECK_DOWNLOAD_MAX_FILES", "0"))
+        self.eviction_interval_seconds = int(os.getenv("MUECK_EVICTION_INTERVAL_SECONDS", "300"))
+
+        # If set to webp or jpeg, images are re-encoded in that format before they're
+        # uploaded to Slack. The original stays on disk.
+
+        self.transcode_format = os.getenv("MUECK_TRANSCODE_FORMAT", "").lower()
+        self.transcode_quality = int(os.getenv("MUECK_TRANSCODE_QUALITY", "90"))
+        self.transcode_processes = int(os.getenv("MUECK_TRANSCODE_PROCESSES", "2"))
+
+        # How many events a single worker keeps in flight at once, across every
+        # stage of its pipeline.
+
+        self.worker_concurrency = int(os.getenv("MUECK_WORKER_CONCURRENCY", "16"))
+
+        # How many threads each stage of the worker's pipeline gets.
+
+        self.submit_concurrency = int(os.getenv("MUECK_SUBMIT_CONCURRENCY", "2"))
+        self.download_concurrency = int(os.getenv("MUECK_DOWNLOAD_CONCURRENCY", "4"))
+        self.upload_concurrency = int(os.getenv("MUECK_UPLOAD_CONCURRENCY", "2"))
+        self.finalize_concurrency = int(os.getenv("MUECK_FINALIZE_CONCURRENCY", "1"))
+
+        # Identifies this worker's claims on the event queue. Claims expire after the
+        # lease, unless the worker renews them, so another worker can pick them up.
+
+        self.worker_id = os.getenv("MUECK_WORKER_ID", f"{socket.gethostname()}:{os.getpid()}")
+        self.worker_lease_seconds = int(os.getenv("MUECK_WORKER_LEASE_SECONDS", "300"))
+
+        # The worker is woken by NOTIFY when events arrive, and falls back to polling
+        # the queue this often in case a notification is missed.
+
+        self.worker_poll_seconds = int(os.getenv("MUECK_WORKER_POLL_SECONDS", "60"))
+
+        #
+        # Default concurrency caps for workspaces and accounts that don't set their
+        # own max_concurrency. 0 means no limit.
+        #
+
+        self.workspace_concurrency = int(os.getenv("MUECK_WORKSPACE_CONCURRENCY", "0"))
+        self.account_concurrency = int(os.getenv("MUECK_ACCOUNT_CONCURRENCY", "0"))
+
+        # Every this many seconds an event waits, it moves up one priority lane.
+
+        self.priority_aging_seconds = int(os.getenv("MUECK_PRIORITY_AGING_SECONDS", "300"))
+
+        #
+        # A job that's still unfinished this long after we started waiting on it
+        # is treated as failed (0 waits forever). Failed events are retried after
+        # retry_base_seconds, doubling each time up to retry_max_seconds, and
+        # dead-lettered after max_attempts failures.
+        #
+
+        self.tensorart_deadline_seconds = int(os.getenv("MUECK_TENSORART_DEADLINE_SECONDS", "900"))
+        self.civitai_deadline_seconds = int(os.getenv("MUECK_CIVITAI_DEADLINE_SECONDS", "1800"))
+
+        self.max_attempts = int(os.getenv("MUECK_MAX_ATTEMPTS", "3"))
+        self.retry_base_seconds = int(os.getenv("MUECK_RETRY_BASE_SECONDS", "30"))
+        self.retry_max_seconds = int(os.getenv("MUECK_RETRY_MAX_SECONDS", "900"))
+
+        # Processed events are moved out of the hot queue into slack_event_archive
+        # after this many days. Archive partitions older than the retention are dropped;
+        # zero keeps them forever.
+
+        self.archive_after_days = int(os.getenv("MUECK_ARCHIVE_AFTER_DAYS", "7"))
+        self.archive_batch_size = int(os.getenv("MUECK_ARCHIVE_BATCH_SIZE", "1000"))
+        self.archive_retention_months = int(os.getenv("MUECK_ARCHIVE_RETENTION_MONTHS", "0"))
\ No newline at end of file
@@ -1,34 +1,64 @@
 import os
 
 from psycopg import Cursor
-from psycopg_pool import ConnectionPool
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+def get_connection_params() -> str:
+    database_name = os.getenv("MUECK_DB_DATABASE")
+    database_user = os.getenv("MUECK_DB_USERNAME")
+    database_password = os.getenv("MUECK_DB_PASSWORD")
+    database_host = os.getenv("MUECK_DB_HOSTNAME")
+    database_port = os.getenv("MUECK_DB_PORT")
+
+    tls_ca = os.getenv("MUECK_DB_CA")
+    tls_certificate = os.getenv("MUECK_DB_CERTIFICATE")
+    tls_private_key = os.getenv("MUECK_DB_PRIVATE_KEY")
+
+    connection_params = (
+        f"dbname={database_name} " +
+        f"user={database_user} " +
+        f"password={database_password} " +
+        f"host={database_host} " +
+        f"port={database_port}"
+    )
+
+    if tls_ca and tls_certificate and tls_private_key:
+        connection_params += (
+            f" sslmode=require" +
+            f" sslrootcert={tls_ca}" +
+            f" sslcert={tls_certificate}" +
+            f" sslkey={tls_private_key}"
+        )
+
+    return connection_params
 
 class DatabasePool:
     def __init__(self):
-        database_name = os.getenv("MUECK_DB_DATABASE")
-        database_user = os.getenv("MUECK_DB_USERNAME")
-        database_password = os.getenv("MUECK_DB_PASSWORD")
-        database_host = os.getenv("MUECK_DB_HOSTNAME")
-        database_port = os.getenv("MUECK_DB_PORT")
-
-        tls_ca = os.getenv("MUECK_DB_CA")
-        tls_certificate = os.getenv("MUECK_DB_CERTIFICATE")
-        tls_private_key = os.getenv("MUECK_DB_PRIVATE_KEY")
-
-        connection_params = (
-            f"dbname={database_name} " +
-            f"user={database_user} " +
-            f"password={database_password} " +
-            f"host={database_host} " +
-            f"port={database_port}"
-        )
+        connection_params = get_connection_params()
+
+        self.connection_params = connection_params
+        self.pool = ConnectionPool(conninfo=connection_params)
+
+class AsyncDatabasePool:
+
+    #
+    # For code running on an event loop, like the FastAPI handlers, so a slow
+    # query doesn't block every other request. The pool has to be opened from
+    # inside the event loop, so it starts closed; call open() on startup.
+    #
+    # The Async*Store classes in lib/store/ run on this pool. Each has only the
+    # queries the web tier uses, and shares its SQL with the synchronous store
+    # next to it.
+    #
+
+    def __init__(self):
+        connection_params = get_connection_params()
+
+        self.connection_params = connection_params
+        self.pool = AsyncConnectionPool(conninfo=connection_params, open=False)
 
-        if tls_ca and tls_certificate and tls_private_key:
-            connection_params += (
-                f" sslmode=require" +
-                f" sslrootcert={tls_ca}" +
-                f" sslcert={tls_certificate}" +
-                f" sslkey={tls_private_key}"
-            )
+    async def open(self):
+        await self.pool.open()
 
-        self.pool = ConnectionPool(conninfo=connection_params)
\ No newline at end of file
+    async def close(self):
+        await self.pool.close()
\ No newline at end of file
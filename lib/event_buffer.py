@@ -0,0 +1,159 @@
+import asyncio
+
+from psycopg import OperationalError
+from typing import Any, Awaitable, Callable, List, Optional
+
+from lib.context import MueckContext
+from lib.slack_event import SlackEvent
+from lib.models.slack_event import SlackEventRecord
+from lib.store.slack_event import AsyncSlackEventStore
+
+MAX_RETRY_DELAY = 30.0
+
+class SlackEventBuffer:
+
+    #
+    # Lets the webhook acknowledge an event as soon as its signature checks out.
+    # Verified events are queued in memory, and a background task writes them to
+    # slack_event in batches: it waits up to the flush interval for more events
+    # to arrive, or until it has a full batch, and inserts them all at once.
+    #
+    # At most buffer_size events (and at most one flush interval's worth) are
+    # ever held only in memory. When the buffer is full, the webhook saves the
+    # event itself before answering. If the database is down, the batch is
+    # retried with backoff until it goes through, the buffer fills up, and the
+    # webhook starts failing -- so Slack retries those events, instead of us
+    # silently dropping them.
+    #
+    # Only connection problems are retried. If the database rejects the batch
+    # itself, the events are saved one at a time, and any event it won't take
+    # is logged and dropped, so one bad event can't hold up all the others.
+    #
+
+    def __init__(self, context: MueckContext, store: Optional[AsyncSlackEventStore] = None):
+        self.context = context
+
+        if store is None:
+            store = AsyncSlackEventStore(context)
+
+        self.store = store
+
+        self.batch_size = context.event_batch_size
+        self.flush_interval = context.event_flush_ms / 1000
+
+        self.queue: asyncio.Queue[Optional[SlackEventRecord]] = asyncio.Queue(maxsize=context.event_buffer_size)
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.__run())
+
+    async def stop(self):
+
+        #
+        # Write out whatever's still buffered before we exit, but don't hold up
+        # shutdown for longer than event_drain_seconds if the database is down.
+        #
+
+        if not self.task:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.context.event_drain_seconds
+
+        try:
+            await asyncio.wait_for(self.queue.put(None), max(0, deadline - loop.time()))
+            await asyncio.wait_for(self.task, max(0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.task.cancel()
+
+            self.context.logger.error(f"Gave up draining the event buffer; unsaved={self.queue.qsize()}")
+
+    async def enqueue(self, slack_event: SlackEvent) -> bool:
+
+        # Returns False if this is a redelivery of an event we've already saved.
+
+        try:
+            self.queue.put_nowait(slack_event.record)
+        except asyncio.QueueFull:
+            self.context.logger.warning("Event buffer is full; saving event directly.")
+
+            return await slack_event.save_event_async()
+
+        slack_event.mark_event_seen()
+
+        return True
+
+    async def __run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            record = await self.queue.get()
+
+            if record is None:
+                return
+
+            batch = [record]
+            stopping = False
+
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+
+                if timeout <= 0:
+                    break
+
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+                if record is None:
+                    stopping = True
+
+                    break
+
+                batch.append(record)
+
+            await self.__flush(batch)
+
+            if stopping:
+                return
+
+    async def __flush(self, batch: List[SlackEventRecord]):
+        try:
+            saved = await self.__retry(self.store.save_events, batch)
+
+            self.context.logger.debug(f"Flushed events: batch={len(batch)}, saved={saved}")
+
+            return
+        except Exception as e:
+            self.context.logger.error(f"Failed to flush {len(batch)} events, saving them one at a time: {e}")
+
+        for record in batch:
+            try:
+                await self.__retry(self.store.save_event, record)
+            except Exception as e:
+                self.context.logger.error(
+                    f"Dropping event that can't be saved: " +
+                    f"app_id={record.app_id}, " +
+                    f"event_id={record.slack_event_id}, " +
+                    f"error={e}, " +
+                    f"event={(record.raw_event or str(record.event))[:1024]}"
+                )
+
+    async def __retry(self, save: Callable[[Any], Awaitable[Any]], value: Any) -> Any:
+
+        # Keep trying through connection problems. Anything else is the data's fault.
+
+        delay = 0.5
+
+        while True:
+            try:
+                return await save(value)
+            except OperationalError as e:
+                self.context.logger.error(f"Lost the database while saving events, retrying in {delay}s: {e}")
+
+                await asyncio.sleep(delay)
+
+                delay = min(delay * 2, MAX_RETRY_DELAY)
\ No newline at end of file
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from psycopg import Connection, Error as DatabaseError
+from psycopg import sql
+from typing import Callable, Dict, Optional
+
+from lib.context import MueckContext
+
+#
+# Triggers send notifications on these channels. See schema/init.sql.
+#
+# - slack_event_created: a new event was inserted; the payload is its ID
+# - slack_integration_changed: an integration was added, changed or removed;
+#   the payload is "<id>:<app_id>"
+#
+# The listener sends this one itself, from the vendor callback endpoint:
+#
+# - vendor_job_updated: a vendor called back about an event's job; the
+#   payload is the event's ID
+#
+
+SLACK_EVENT_CHANNEL = "slack_event_created"
+SLACK_INTEGRATION_CHANNEL = "slack_integration_changed"
+VENDOR_CALLBACK_CHANNEL = "vendor_job_updated"
+
+class NotificationListener:
+
+    #
+    # Listens for Postgres notifications on a set of channels and calls the
+    # handler for each one with the notification's payload. If we lose the
+    # connection, every handler is called with None once we're back, since we
+    # may have missed notifications while we were away.
+    #
+
+    def __init__(self, context: MueckContext, handlers: Dict[str, Callable[[Optional[str]], None]]):
+        self.context = context
+        self.handlers = handlers
+
+        self.thread = threading.Thread(target=self.__listen, name="notification-listener", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def __listen(self):
+
+        #
+        # LISTEN needs a connection of its own that stays open, so we don't borrow
+        # one from the pool.
+        #
+
+        while True:
+            try:
+                with Connection.connect(self.context.dbh.connection_params, autocommit=True) as connection:
+                    for channel in self.handlers:
+                        connection.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+
+                    self.context.logger.info(f"Listening for notifications on channels={list(self.handlers)}")
+
+                    for handler in self.handlers.values():
+                        handler(None)
+
+                    for notification in connection.notifies():
+                        self.context.logger.debug(f"Received notification: channel={notification.channel}, payload={notification.payload}")
+
+                        handler = self.handlers.get(notification.channel)
+
+                        if handler:
+                            handler(notification.payload)
+            except DatabaseError as e:
+                self.context.logger.error(f"Lost notification connection: {e}")
+
+            time.sleep(5)
\ No newline at end of file
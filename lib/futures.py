@@ -0,0 +1,83 @@
+import threading
+
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+#
+# Work that has to wait on something else, like a Slack call waiting for its
+# workspace's rate limit, is handed on as a future instead of holding a thread
+# while it waits. These chain futures together without blocking on them.
+#
+
+def gather(futures: List[Future]) -> Future:
+
+    # Resolves with every result, in order, once they're all done, or with the first exception.
+
+    result = Future()
+    remaining = len(futures)
+    lock = threading.Lock()
+
+    if not futures:
+        result.set_result([])
+
+        return result
+
+    def on_done(future: Future):
+        nonlocal remaining
+
+        with lock:
+            if result.done():
+                return
+
+            if future.exception():
+                result.set_exception(future.exception())
+
+                return
+
+            remaining -= 1
+
+            if remaining == 0:
+                result.set_result([f.result() for f in futures])
+
+    for future in futures:
+        future.add_done_callback(on_done)
+
+    return result
+
+def then(future: Future, callback: Callable[[Any], Any]) -> Future:
+
+    #
+    # Calls callback with the future's result once it's done. If the callback
+    # returns another future, the future we return follows that one instead.
+    #
+
+    result = Future()
+
+    def on_done(done: Future):
+        try:
+            value = callback(done.result())
+        except BaseException as e:
+            result.set_exception(e)
+
+            return
+
+        if isinstance(value, Future):
+            follow(value, result)
+        else:
+            result.set_result(value)
+
+    future.add_done_callback(on_done)
+
+    return result
+
+def follow(future: Future, result: Future):
+
+    # Resolves result the same way as future, once it's done.
+
+    def on_done(done: Future):
+        if done.exception():
+            result.set_exception(done.exception())
+        else:
+            result.set_result(done.result())
+
+    future.add_done_callback(on_done)
\ No newline at end of file
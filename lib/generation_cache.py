@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from lib.context import MueckContext
+from lib.generators.base import ImageGenerator
+from lib.generators.cached import CachedGeneration
+from lib.image_store import ImageStore
+from lib.models.generated_image import ImageGenerationRequest
+from lib.store.slack_event import SlackEventStore
+
+#
+# Jobs in these states are still running at the vendor, so a new identical
+# request can share them. So can a complete job whose images haven't been
+# downloaded yet.
+#
+
+IN_FLIGHT_STATUSES = ["created", "queued", "running"]
+
+def compute_cache_key(image_generator: ImageGenerator) -> Optional[str]:
+
+    #
+    # Only requests with an explicit seed produce the same image twice, so
+    # there's nothing to cache without one. Whitespace in the prompt doesn't
+    # change the result, so we collapse it.
+    #
+
+    if image_generator.seed is None or image_generator.seed < 0:
+        return None
+
+    prompt = " ".join(image_generator.prompt.split())
+
+    key = "\x00".join([
+        prompt,
+        str(image_generator.seed),
+        image_generator.model_vendor.value,
+        image_generator.checkpoint or "",
+    ])
+
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class GenerationCache:
+
+    #
+    # Finds earlier requests for the same prompt, seed, vendor and checkpoint,
+    # either finished -- so we can reuse the images we already have -- or still
+    # running, so we can wait on that job instead of paying for another one.
+    #
+
+    # Per-key locks, with the number of threads holding or waiting on each.
+
+    _locks: Dict[str, Tuple[threading.Lock, int]] = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, context: MueckContext, store: Optional[SlackEventStore] = None):
+        self.context = context
+
+        if store is None:
+            store = SlackEventStore(context)
+
+        self.store = store
+        self.image_store = ImageStore(context)
+
+    @contextmanager
+    def lock(self, cache_key: str) -> Iterator[None]:
+
+        #
+        # Serializes lookups and submissions for the same key, so two identical
+        # requests that arrive together can't both miss the cache and both start
+        # a job. Workers on other hosts are kept out by an advisory lock in the
+        # database. Threads in this process queue on a lock of their own first,
+        # so they don't each hold a pooled connection while they wait.
+        #
+
+        with self._locks_guard:
+            (lock, users) = self._locks.get(cache_key, (threading.Lock(), 0))
+
+            self._locks[cache_key] = (lock, users + 1)
+
+        try:
+            with lock:
+                with self.store.lock_cache_key(cache_key):
+                    yield
+        finally:
+            with self._locks_guard:
+                (lock, users) = self._locks[cache_key]
+
+                if users == 1:
+                    del self._locks[cache_key]
+                else:
+                    self._locks[cache_key] = (lock, users - 1)
+
+    def find_completed(self, cache_key: str) -> Optional[CachedGeneration]:
+        image_generation_request = self.store.get_downloaded_image_generation_request_by_cache_key(cache_key)
+
+        if not image_generation_request:
+            return None
+
+        images = self.store.get_generated_images(image_generation_request.id)
+
+        #
+        # Mark the files as used before we check them, so the evictor doesn't
+        # pick them while this event is still on its way to the upload.
+        #
+
+        self.image_store.touch([image.filename for image in images])
+
+        #
+        # If any of the files have gone, treat it as a miss and generate the
+        # images again.
+        #
+
+        if not images or not all(image.filename and os.path.exists(image.filename) for image in images):
+            return None
+
+        self.context.logger.info(f"Cache hit: cache_key={cache_key}, image_generation_request_id={image_generation_request.id}")
+
+        return CachedGeneration(self.context, image_generation_request, images)
+
+    def find_in_flight(self, cache_key: str) -> Optional[ImageGenerationRequest]:
+        image_generation_request = self.store.get_in_flight_image_generation_request_by_cache_key(cache_key, IN_FLIGHT_STATUSES)
+
+        if image_generation_request:
+            self.context.logger.info(f"Joining in-flight job: cache_key={cache_key}, job_id={image_generation_request.job_id}")
+
+        return image_generation_request
\ No newline at end of file
@@ -1,9 +1,21 @@
+from __future__ import annotations
+
 from typing import List, Optional
 
 from lib.context import MueckContext
 from lib.models.generated_image import GeneratedImage
 
 class ImageGenerator:
+
+    #
+    # How many jobs refresh_statuses is given at a time. Checking one job is
+    # one request, so by default jobs are checked one per thread, side by side.
+    # Vendors that override refresh_statuses to check many jobs in one request
+    # should raise this.
+    #
+
+    status_batch_size = 1
+
     def __init__(self, context: MueckContext):
         self.context = context
 
@@ -14,4 +26,26 @@ class ImageGenerator:
         self.status: Optional[str] = None
         self.credits: float = 0.0
         self.seed: int = -1
-        self.images = List[GeneratedImage]
\ No newline at end of file
+        self.checkpoint: Optional[str] = None
+        self.queue_position: int = 0
+        self.queue_length: int = 0
+        self.callback_url: Optional[str] = None
+        self.images = List[GeneratedImage]
+
+    @classmethod
+    def refresh_statuses(cls, image_generators: List[ImageGenerator]):
+
+        #
+        # Bring the status of several of this vendor's jobs up to date. Vendors
+        # with an endpoint that reports on many jobs at once should override this.
+        # A job that fails to update keeps its previous status.
+        #
+
+        for image_generator in image_generators:
+            try:
+                image_generator.get_status()
+            except Exception as e:
+                image_generator.context.logger.error(f"Failed to get status for job_id={image_generator.id}: {e}", exc_info=True)
+
+    def get_status(self) -> str:
+        raise NotImplementedError()
\ No newline at end of file
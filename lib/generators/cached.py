@@ -0,0 +1,34 @@
+from typing import List
+
+from lib.context import MueckContext
+from lib.generators.base import ImageGenerator
+from lib.models.generated_image import GeneratedImage, ImageGenerationRequest
+
+class CachedGeneration(ImageGenerator):
+
+    #
+    # Stands in for a vendor job when we've already generated the same prompt,
+    # seed and checkpoint before. It's complete from the start, and its images
+    # are the files we already have on disk.
+    #
+
+    def __init__(
+        self,
+        context: MueckContext,
+        image_generation_request: ImageGenerationRequest,
+        images: List[GeneratedImage],
+    ):
+        super().__init__(context)
+
+        self.model_vendor = image_generation_request.model_vendor
+        self.id = image_generation_request.job_id
+        self.token = image_generation_request.token
+        self.status = "complete"
+        self.credits = 0.0
+        self.images = images
+
+    def execute(self):
+        return
+
+    def get_status(self) -> str:
+        return self.status
\ No newline at end of file
@@ -22,6 +22,7 @@ class CivitAI(ImageGenerator):
         super().__init__(context)
 
         self.model_vendor = ModelVendor.civitai
+        self.checkpoint = CYBERREALISTIC_PONY_CHECKPOINT
 
         if job_id:
             self.id = job_id
@@ -33,12 +34,15 @@ class CivitAI(ImageGenerator):
         if prompt:
             self.prompt = prompt
 
+        if seed is not None:
+            self.seed = int(seed)
+
     def execute(self):
         if not self.prompt:
             raise ValueError("Prompt is required to create a job.")
 
         request = {
-            "model": CYBERREALISTIC_PONY_CHECKPOINT,
+            "model": self.checkpoint,
             "params": {
                 "cfgScale": 3.5,
                 "clipSkip": 2,
@@ -50,6 +54,12 @@ class CivitAI(ImageGenerator):
             }
         }
 
+        if self.seed >= 0:
+            request["params"]["seed"] = self.seed
+
+        if self.callback_url:
+            request["callbackUrl"] = self.callback_url
+
         response = civitai.image.create(request)
 
         # self.context.logger.debug(json.dumps(response, indent=4))
@@ -69,6 +79,13 @@ class CivitAI(ImageGenerator):
 
         # self.context.logger.debug(json.dumps(response, indent=4))
 
+        # The token no longer refers to any jobs, so this one is never going to finish.
+
+        if not response.get("jobs"):
+            self.status = "error"
+
+            return self.status
+
         for job in response["jobs"]:
             self.credits = job["cost"]
 
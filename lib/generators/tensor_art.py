@@ -1,6 +1,5 @@
 import json
 import re
-import requests
 import uuid
 
 from typing import List, Optional
@@ -15,6 +14,10 @@ FLUX_PONY_CHECKPOINT = "763947005736342551"
 OBLIVIOUS_MIX_ILLUSTRIOUS_CHECKPOINT = "808939700149555823"
 STABLE_DIFFUSION_35_CHECKPOINT = "808211415430243917"
 
+# Job statuses that mean the job is over and didn't produce anything.
+
+FAILED_STATUSES = ["FAILED", "CANCELED", "CANCELLED", "ERROR"]
+
 class TensorArtJob(ImageGenerator):
     def __init__(
         self,
@@ -26,6 +29,7 @@ class TensorArtJob(ImageGenerator):
         super().__init__(context)
 
         self.model_vendor = ModelVendor.tensor_art
+        self.checkpoint = FLUX_PONY_CHECKPOINT
 
         self.api_key = context.tensorart_api_key
         self.endpoint = context.tensorart_endpoint
@@ -36,9 +40,6 @@ class TensorArtJob(ImageGenerator):
             "Accept": "application/json",
         }
 
-        self.queue_position: int = 0
-        self.queue_length: int = 0
-
         if job_id:
             self.id = job_id
             self.status = "pending"
@@ -46,6 +47,9 @@ class TensorArtJob(ImageGenerator):
         if prompt:
             self.prompt = prompt
 
+        if seed is not None:
+            self.seed = int(seed)
+
     def execute(self):
         if not self.prompt:
             raise ValueError("Prompt is required to create a job.")
@@ -77,7 +81,7 @@ class TensorArtJob(ImageGenerator):
                         ],
                         "sampler": "Euler a",
                         "sdVae": "Automatic",
-                        "sd_model": FLUX_PONY_CHECKPOINT,
+                        "sd_model": self.checkpoint,
                         "steps": 20,
                         "width": 1024,
                     }
@@ -85,7 +89,12 @@ class TensorArtJob(ImageGenerator):
             ]
         }
 
-        r = requests.post(url, headers=self.headers, json=body)
+        # Ask TensorArt to tell us when the job is done, so we don't have to keep asking.
+
+        if self.callback_url:
+            body["callbackUrl"] = self.callback_url
+
+        r = self.context.http.post(url, headers=self.headers, json=body)
 
         response = r.json()
 
@@ -101,7 +110,14 @@ class TensorArtJob(ImageGenerator):
             raise ValueError("Job ID is required to get a job.")
 
         url = f"{self.endpoint}/v1/jobs/{self.id}"
-        r = requests.get(url, headers=self.headers)
+        r = self.context.http.get(url, headers=self.headers)
+
+        # The job is gone, so it's never going to finish.
+
+        if r.status_code == 404:
+            self.status = "error"
+
+            return self.status
 
         response = r.json()
         status = response["job"]["status"]
@@ -114,6 +130,8 @@ class TensorArtJob(ImageGenerator):
             self.__parse_running_job(response)
         elif status == "SUCCESS":
             self.__parse_successful_job(response)
+        elif status in FAILED_STATUSES:
+            self.status = "error"
         else:
             self.status = "queued"
 
@@ -0,0 +1,104 @@
+import hashlib
+import os
+
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from typing import Optional
+
+# (connect, read) in seconds.
+
+DEFAULT_TIMEOUT = (5.0, 30.0)
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_ATTEMPTS = 3
+
+class HttpSession(Session):
+
+    #
+    # A requests session with keep-alive connection pools, a default timeout,
+    # and retries with backoff for idempotent requests. It's shared by everything
+    # in the process that talks HTTP, so repeated calls to the same host reuse
+    # an open connection instead of doing a new TCP and TLS handshake each time.
+    #
+
+    def __init__(self, pool_size: int = 16, retries: int = 3, timeout: tuple[float, float] = DEFAULT_TIMEOUT):
+        super().__init__()
+
+        self.timeout = timeout
+
+        #
+        # urllib3 only retries idempotent methods by default, so creating a job
+        # with POST is never sent twice.
+        #
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            respect_retry_after_header=True,
+        )
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+
+        return super().request(method, url, **kwargs)
+
+    def download(self, url: str, filename: str, hash_algorithm: Optional[str] = None, attempts: int = DOWNLOAD_ATTEMPTS) -> Optional[str]:
+
+        #
+        # Stream the response to disk in chunks, so we never hold the whole file in
+        # memory. We write to a temporary file and rename it into place once it's
+        # complete, so nobody ever sees half a file under the real name. If the
+        # transfer breaks, we ask for just the rest of the file with a Range header,
+        # and start over if the server doesn't support that.
+        #
+        # If a hash algorithm is given, the digest of the file is computed as it's
+        # written and returned.
+        #
+
+        partial_filename = f"{filename}.part"
+
+        hasher = hashlib.new(hash_algorithm) if hash_algorithm else None
+        written = 0
+
+        with open(partial_filename, "wb") as fp:
+            for attempt in range(1, attempts + 1):
+                headers = {"Range": f"bytes={written}-"} if written else {}
+
+                try:
+                    with self.get(url, headers=headers, stream=True) as r:
+                        r.raise_for_status()
+
+                        if written and r.status_code != 206:
+                            fp.seek(0)
+                            fp.truncate()
+
+                            hasher = hashlib.new(hash_algorithm) if hash_algorithm else None
+                            written = 0
+
+                        for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            fp.write(chunk)
+
+                            if hasher:
+                                hasher.update(chunk)
+
+                            written += len(chunk)
+
+                    break
+                except RequestException:
+                    if attempt == attempts:
+                        fp.close()
+                        os.unlink(partial_filename)
+
+                        raise
+
+        os.replace(partial_filename, filename)
+
+        return hasher.hexdigest() if hasher else None
\ No newline at end of file
@@ -0,0 +1,71 @@
+import glob
+import os
+import threading
+import time
+
+from typing import Optional
+
+from lib.context import MueckContext
+from lib.store.generated_image import GeneratedImageStore
+
+class ImageEvictor:
+
+    #
+    # Keeps MUECK_DOWNLOAD_PATH within a byte and/or file budget by deleting the
+    # least recently used images. Rows that pointed at a deleted file are marked
+    # as evicted, so a later request for the same image generates it again
+    # instead of trying to upload a file that isn't there.
+    #
+
+    def __init__(self, context: MueckContext, store: Optional[GeneratedImageStore] = None):
+        self.context = context
+
+        if store is None:
+            store = GeneratedImageStore(context)
+
+        self.store = store
+
+        self.max_bytes = context.download_max_bytes
+        self.max_files = context.download_max_files
+        self.interval = context.eviction_interval_seconds
+
+        self.thread = threading.Thread(target=self.__run, name="image-evictor", daemon=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.max_files > 0
+
+    def start(self):
+        if self.enabled:
+            self.thread.start()
+
+    def evict(self) -> int:
+        filenames = self.store.get_files_over_budget(self.max_bytes, self.max_files)
+
+        for filename in filenames:
+
+            # Remove the image along with anything derived from it, like transcoded copies.
+
+            (stem, _extension) = os.path.splitext(filename)
+
+            for path in glob.glob(f"{glob.escape(stem)}.*"):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+            self.store.mark_evicted(filename)
+
+        if filenames:
+            self.context.logger.info(f"Evicted {len(filenames)} images.")
+
+        return len(filenames)
+
+    def __run(self):
+        while True:
+            try:
+                self.evict()
+            except Exception as e:
+                self.context.logger.error(f"Failed to evict images: {e}", exc_info=True)
+
+            time.sleep(self.interval)
\ No newline at end of file
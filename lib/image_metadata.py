@@ -0,0 +1,186 @@
+import io
+import struct
+import zlib
+
+from typing import BinaryIO, Optional
+
+from lib.models.image_metadata import ImageMetadata
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# JPEG start-of-frame markers, which carry the dimensions. C4, C8 and CC aren't frames.
+
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+#
+# Reads the dimensions and text metadata of PNG, JPEG and WebP images from their
+# headers, without decoding any pixels. Pixel data is skipped over with seek(),
+# so the cost doesn't depend on the size of the image.
+#
+
+def read_image_metadata(filename: str) -> Optional[ImageMetadata]:
+    with open(filename, "rb") as fp:
+        return read_image_metadata_from_file(fp)
+
+def read_image_metadata_from_bytes(data: bytes) -> Optional[ImageMetadata]:
+
+    #
+    # Works on just the start of a file, e.g. the first chunks of a download,
+    # as long as the headers we're after are in it.
+    #
+
+    return read_image_metadata_from_file(io.BytesIO(data))
+
+def read_image_metadata_from_file(fp: BinaryIO) -> Optional[ImageMetadata]:
+    header = fp.read(12)
+
+    fp.seek(0)
+
+    if header.startswith(PNG_SIGNATURE):
+        return read_png_metadata(fp)
+    elif header.startswith(b"\xff\xd8"):
+        return read_jpeg_metadata(fp)
+    elif header[0:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return read_webp_metadata(fp)
+
+    return None
+
+def read_png_metadata(fp: BinaryIO) -> ImageMetadata:
+    metadata = ImageMetadata(format="png")
+
+    fp.seek(len(PNG_SIGNATURE))
+
+    while True:
+        chunk_header = fp.read(8)
+
+        if len(chunk_header) < 8:
+            break
+
+        (length, chunk_type) = struct.unpack(">I4s", chunk_header)
+
+        if chunk_type == b"IHDR":
+            (metadata.width, metadata.height) = struct.unpack(">II", fp.read(8))
+
+            fp.seek(length - 8 + 4, 1)
+        elif chunk_type in (b"tEXt", b"zTXt", b"iTXt"):
+            data = fp.read(length)
+
+            fp.seek(4, 1)
+
+            (keyword, text) = _parse_png_text_chunk(chunk_type, data)
+
+            if keyword:
+                metadata.text[keyword] = text
+        elif chunk_type == b"IEND":
+            break
+        else:
+            # Skip the chunk's data and its CRC.
+
+            fp.seek(length + 4, 1)
+
+    return metadata
+
+def _parse_png_text_chunk(chunk_type: bytes, data: bytes) -> tuple[Optional[str], str]:
+    try:
+        (keyword, rest) = data.split(b"\x00", 1)
+
+        if chunk_type == b"tEXt":
+            text = rest.decode("latin-1")
+        elif chunk_type == b"zTXt":
+            text = zlib.decompress(rest[1:]).decode("latin-1")
+        else:
+            compressed = rest[0]
+            (_language, _translated_keyword, text_bytes) = rest[2:].split(b"\x00", 2)
+
+            if compressed:
+                text_bytes = zlib.decompress(text_bytes)
+
+            text = text_bytes.decode("utf-8")
+    except (ValueError, IndexError, zlib.error, UnicodeDecodeError):
+        return (None, "")
+
+    return (keyword.decode("latin-1"), text)
+
+def read_jpeg_metadata(fp: BinaryIO) -> ImageMetadata:
+    metadata = ImageMetadata(format="jpeg")
+
+    fp.seek(2)
+
+    while True:
+        marker = fp.read(2)
+
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+
+        marker_type = marker[1]
+
+        # Standalone markers have no length.
+
+        if marker_type == 0x01 or 0xD0 <= marker_type <= 0xD7:
+            continue
+
+        if marker_type in (0xD9, 0xDA):
+            break
+
+        (length,) = struct.unpack(">H", fp.read(2))
+
+        if marker_type in JPEG_SOF_MARKERS:
+            (_precision, height, width) = struct.unpack(">BHH", fp.read(5))
+
+            metadata.width = width
+            metadata.height = height
+
+            break
+        elif marker_type == 0xFE:
+            metadata.text["comment"] = fp.read(length - 2).decode("utf-8", errors="replace")
+        else:
+            fp.seek(length - 2, 1)
+
+    return metadata
+
+def read_webp_metadata(fp: BinaryIO) -> ImageMetadata:
+    metadata = ImageMetadata(format="webp")
+
+    fp.seek(12)
+
+    while True:
+        chunk_header = fp.read(8)
+
+        if len(chunk_header) < 8:
+            break
+
+        (chunk_type, length) = struct.unpack("<4sI", chunk_header)
+
+        # Chunks are padded to an even length.
+
+        padded_length = length + (length & 1)
+
+        if chunk_type == b"VP8X":
+            data = fp.read(10)
+
+            metadata.width = int.from_bytes(data[4:7], "little") + 1
+            metadata.height = int.from_bytes(data[7:10], "little") + 1
+
+            fp.seek(padded_length - 10, 1)
+        elif chunk_type == b"VP8 " and not metadata.width:
+            data = fp.read(10)
+
+            (width, height) = struct.unpack("<HH", data[6:10])
+
+            metadata.width = width & 0x3FFF
+            metadata.height = height & 0x3FFF
+
+            fp.seek(padded_length - 10, 1)
+        elif chunk_type == b"VP8L" and not metadata.width:
+            data = fp.read(5)
+
+            bits = int.from_bytes(data[1:5], "little")
+
+            metadata.width = (bits & 0x3FFF) + 1
+            metadata.height = ((bits >> 14) & 0x3FFF) + 1
+
+            fp.seek(padded_length - 5, 1)
+        else:
+            fp.seek(padded_length, 1)
+
+    return metadata
\ No newline at end of file
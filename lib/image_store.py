@@ -0,0 +1,92 @@
+import os
+import uuid
+
+from typing import List, Optional
+
+from lib.context import MueckContext
+from lib.image_metadata import read_image_metadata
+from lib.store.generated_image import GeneratedImageStore
+
+INCOMING_DIRECTORY = ".incoming"
+
+EXTENSIONS = {
+    "png": "png",
+    "jpeg": "jpg",
+    "webp": "webp",
+}
+
+class ImageStore:
+
+    #
+    # Keeps images under MUECK_DOWNLOAD_PATH named by the SHA-256 of their
+    # contents, sharded into two levels of subdirectories by the first bytes
+    # of the hash, e.g. ab/cd/abcd1234....png. Identical images are only
+    # stored once, and every generated_image row that has the same hash refers
+    # to the same file.
+    #
+
+    def __init__(self, context: MueckContext, store: Optional[GeneratedImageStore] = None):
+        self.context = context
+        self.root = context.download_path
+
+        if store is None:
+            store = GeneratedImageStore(context)
+
+        self.store = store
+
+    def path_for(self, sha256: str, extension: str = "png") -> str:
+        return os.path.join(self.root, sha256[0:2], sha256[2:4], f"{sha256}.{extension}")
+
+    def store_from_url(self, url: str) -> tuple[str, str]:
+
+        #
+        # Download into a scratch directory on the same filesystem, so that once
+        # we know the hash we can move the file into place with an atomic rename.
+        # If we already have the file, we keep the existing copy.
+        #
+
+        incoming_directory = os.path.join(self.root, INCOMING_DIRECTORY)
+
+        os.makedirs(incoming_directory, exist_ok=True)
+
+        incoming_filename = os.path.join(incoming_directory, str(uuid.uuid4()))
+
+        sha256 = self.context.http.download(url, incoming_filename, hash_algorithm="sha256")
+
+        metadata = read_image_metadata(incoming_filename)
+        extension = EXTENSIONS.get(metadata.format, "png") if metadata else "png"
+
+        filename = self.path_for(sha256, extension)
+
+        if os.path.exists(filename):
+            self.context.logger.debug(f"Image already stored: sha256={sha256}")
+
+            os.unlink(incoming_filename)
+        else:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            os.replace(incoming_filename, filename)
+
+        return (filename, sha256)
+
+    def lookup(self, sha256: str) -> Optional[str]:
+
+        # Returns the filename of an image we already have, if any.
+
+        filename = self.store.get_filename_by_sha256(sha256)
+
+        if filename and os.path.exists(filename):
+            return filename
+
+        return None
+
+    def count_references(self, sha256: str) -> int:
+        return self.store.count_references(sha256)
+
+    def touch(self, filenames: List[str]):
+
+        # Record that these files were just used, so they're the last to be evicted.
+
+        filenames = [filename for filename in filenames if filename]
+
+        if filenames:
+            self.store.touch(filenames)
\ No newline at end of file
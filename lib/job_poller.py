@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from lib.context import MueckContext
+from lib.poll_scheduler import PollScheduler
+from lib.slack_event import SlackEvent
+from lib.models.generated_image import ImageGenerationRequestUpdate, ModelVendor
+
+# How long to wait before trying again when something goes wrong while polling.
+
+RETRY_SECONDS = 10
+
+class WatchedJob:
+    def __init__(self, event: SlackEvent):
+        self.event = event
+        self.started = time.monotonic()
+        self.next_poll = self.started
+
+        #
+        # Set while a status check for this job is running. A callback that
+        # arrives meanwhile sets poll_requested, so the job is checked again as
+        # soon as the current check is done.
+        #
+
+        self.polling = False
+        self.poll_requested = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+class JobPoller:
+
+    #
+    # Owns every job that's been submitted to a vendor and hasn't finished yet.
+    # A single thread works out which jobs are due a status check, groups them
+    # by vendor into batches the vendor can check together, and hands the
+    # batches to a pool of threads the size of the HTTP connection pool. It
+    # doesn't wait for them, so a slow vendor or a slow request only delays the
+    # jobs in that batch. Finished jobs are handed to on_complete.
+    #
+    # Status reactions are queued with the Slack dispatcher, so a slow Slack API
+    # doesn't hold up status checks either.
+    #
+    # Jobs that the vendor reports as failed, or that are still going past
+    # their vendor's deadline, are handed to on_failed instead, so a job that
+    # will never finish can't sit in here forever.
+    #
+
+    def __init__(
+        self,
+        context: MueckContext,
+        poll_scheduler: PollScheduler,
+        on_complete: Callable[[SlackEvent], None],
+        on_failed: Callable[[SlackEvent, BaseException], None],
+    ):
+        self.context = context
+        self.poll_scheduler = poll_scheduler
+        self.on_complete = on_complete
+        self.on_failed = on_failed
+
+        self.deadlines: Dict[ModelVendor, int] = {
+            ModelVendor.tensor_art: context.tensorart_deadline_seconds,
+            ModelVendor.civitai: context.civitai_deadline_seconds,
+        }
+
+        self.jobs: Dict[int, WatchedJob] = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+        self.executor = ThreadPoolExecutor(max_workers=max(1, context.http_pool_size), thread_name_prefix="job-poller")
+        self.thread = threading.Thread(target=self.__run, name="job-poller", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    @property
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.jobs)
+
+    def poll_now(self, event_id: Optional[int] = None):
+
+        #
+        # Check a job straight away, because its vendor called back to say it's
+        # changed. With no event ID, check every job, since we may have missed
+        # some callbacks.
+        #
+
+        now = time.monotonic()
+
+        with self.lock:
+            if event_id is None:
+                jobs = list(self.jobs.values())
+            else:
+                jobs = [self.jobs[event_id]] if event_id in self.jobs else []
+
+            for job in jobs:
+                job.next_poll = now
+                job.poll_requested = job.polling
+
+        if jobs:
+            self.wakeup.set()
+
+    def watch(self, event: SlackEvent):
+        with self.lock:
+            self.jobs[event.id] = WatchedJob(event)
+
+        self.wakeup.set()
+
+    def __run(self):
+
+        #
+        # This is the only thread that checks on jobs. If it died, every job
+        # we're waiting on would stall while we kept renewing their leases, so
+        # nothing gets out of here.
+        #
+
+        while True:
+            try:
+                self.__poll_due_jobs()
+            except Exception as e:
+                self.context.logger.error(f"Job poller failed: {e}", exc_info=True)
+
+                time.sleep(RETRY_SECONDS)
+
+    def __poll_due_jobs(self):
+        now = time.monotonic()
+
+        with self.lock:
+            waiting = [job for job in self.jobs.values() if not job.polling]
+            due = [job for job in waiting if job.next_poll <= now]
+            next_poll = min((job.next_poll for job in waiting), default=None)
+
+            for job in due:
+                job.polling = True
+
+        if not due:
+            timeout = None if next_poll is None else next_poll - now
+
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+            return
+
+        by_vendor: Dict[ModelVendor, List[WatchedJob]] = {}
+
+        for job in due:
+            by_vendor.setdefault(job.event.image_generator.model_vendor, []).append(job)
+
+        for jobs in by_vendor.values():
+            batch_size = max(1, type(jobs[0].event.image_generator).status_batch_size)
+
+            for i in range(0, len(jobs), batch_size):
+                self.executor.submit(self.__poll_batch, jobs[i:i + batch_size])
+
+    def __poll_batch(self, jobs: List[WatchedJob]):
+        image_generators = [job.event.image_generator for job in jobs]
+        previous_statuses = [image_generator.status for image_generator in image_generators]
+
+        try:
+            image_generator_class = type(image_generators[0])
+            image_generator_class.refresh_statuses(image_generators)
+
+            for (job, previous_status) in zip(jobs, previous_statuses):
+                try:
+                    self.__handle_status(job, previous_status)
+                except Exception as e:
+                    self.context.logger.error(f"Failed to handle status for event_id={job.event.id}: {e}", exc_info=True)
+        finally:
+
+            # Whatever happened, every job gets another check.
+
+            for job in jobs:
+                self.__schedule(job)
+
+            self.wakeup.set()
+
+    def __schedule(self, job: WatchedJob):
+        try:
+            interval = self.__next_interval(job)
+        except Exception as e:
+            self.context.logger.error(f"Failed to schedule next poll for event_id={job.event.id}: {e}")
+
+            interval = RETRY_SECONDS
+
+        with self.lock:
+            job.next_poll = time.monotonic() + (0 if job.poll_requested else interval)
+            job.polling = False
+            job.poll_requested = False
+
+    def __next_interval(self, job: WatchedJob) -> float:
+        image_generator = job.event.image_generator
+        interval = self.poll_scheduler.next_interval(image_generator, job.elapsed)
+
+        # The vendor will call back when the job's done, so polling is only a fallback.
+
+        if image_generator.callback_url:
+            interval = max(interval, self.context.callback_poll_seconds)
+
+        return interval
+
+    def __handle_status(self, job: WatchedJob, previous_status: str):
+        event = job.event
+        image_generator = event.image_generator
+        status = image_generator.status
+
+        if status != previous_status:
+            self.context.logger.info(f"job_id={image_generator.id}, previous_status={previous_status}, status={status}")
+
+            update = ImageGenerationRequestUpdate(
+                status=status,
+                credits=image_generator.credits,
+            )
+
+            event.reply_with_status(status)
+            event.update_image_generation_request(update)
+
+        if status == "complete":
+            self.poll_scheduler.record_completion(image_generator, job.elapsed)
+
+            self.__remove(job)
+            self.on_complete(event)
+
+            return
+
+        exception = self.__get_failure(job)
+
+        if exception:
+            self.poll_scheduler.forget(image_generator)
+
+            self.__remove(job)
+            self.on_failed(event, exception)
+
+    def __get_failure(self, job: WatchedJob) -> Optional[Exception]:
+        image_generator = job.event.image_generator
+
+        if image_generator.status == "error":
+            return Exception(f"Job failed at the vendor: job_id={image_generator.id}")
+
+        deadline = self.deadlines.get(image_generator.model_vendor, 0)
+
+        if deadline <= 0 or job.elapsed < deadline:
+            return None
+
+        #
+        # Record the job as failed, so that the retry starts a new one instead
+        # of waiting on this one again.
+        #
+
+        try:
+            job.event.update_image_generation_request(ImageGenerationRequestUpdate(status="error"))
+        except Exception as e:
+            self.context.logger.error(f"Failed to mark job_id={image_generator.id} as failed: {e}")
+
+        return Exception(f"Job missed its deadline: job_id={image_generator.id}, elapsed={job.elapsed:.0f}s")
+
+    def __remove(self, job: WatchedJob):
+        with self.lock:
+            self.jobs.pop(job.event.id, None)
\ No newline at end of file
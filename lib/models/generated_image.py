@@ -11,6 +11,8 @@ class ImageGenerationRequest(BaseModel):
     model_vendor: ModelVendor
     job_id: str
     token: Optional[str] = None
+    status: Optional[str] = None
+    cache_key: Optional[str] = None
 
 class ImageGenerationRequestUpdate(BaseModel):
     status: Optional[str] = None
@@ -20,6 +22,9 @@ class GeneratedImage(BaseModel):
     image_id: str
     url: str
     filename: Optional[str] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    upload_filename: Optional[str] = None
     seed: int
     width: int
     height: int
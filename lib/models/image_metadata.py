@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+class ImageMetadata(BaseModel):
+    format: str
+    width: int = 0
+    height: int = 0
+    text: Dict[str, str] = {}
\ No newline at end of file
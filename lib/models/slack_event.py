@@ -1,7 +1,16 @@
 from datetime import datetime
+from enum import Enum
 from pydantic import BaseModel
 from typing import Optional
 
+class SlackEventStage(str, Enum):
+    claimed = "claimed"
+    submitted = "submitted"
+    completed = "completed"
+    downloaded = "downloaded"
+    uploaded = "uploaded"
+    processed = "processed"
+
 class SlackEventRecord(BaseModel):
     id: int
     slack_integration_id: int
@@ -11,4 +20,9 @@ class SlackEventRecord(BaseModel):
     thread_ts: str
     image_generation_request_id: Optional[int]
     created: datetime
-    processed: Optional[datetime]
\ No newline at end of file
+    processed: Optional[datetime]
+    app_id: Optional[str] = None
+    slack_event_id: Optional[str] = None
+    raw_event: Optional[str] = None
+    priority: int = 0
+    stage: SlackEventStage = SlackEventStage.claimed
\ No newline at end of file
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from lib.context import MueckContext
+from lib.job_poller import JobPoller
+from lib.poll_scheduler import PollScheduler
+from lib.slack_event import SlackEvent
+from lib.transcoder import ImageTranscoder
+from lib.models.slack_event import SlackEventStage
+
+class PipelineStage:
+
+    #
+    # One step of the pipeline. Events queue up in front of the stage and are
+    # worked on by up to `concurrency` threads; when an event is done it's
+    # passed on to the next stage.
+    #
+
+    def __init__(self, name: str, concurrency: int, handler: Callable[[SlackEvent], None], stage: SlackEventStage):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.handler = handler
+        self.stage = stage
+
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"pipeline-{name}")
+
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def submit(self, event: SlackEvent, on_done: Callable[[SlackEvent, Future], None]):
+        with self.lock:
+            self.pending += 1
+
+        done = Future()
+        done.add_done_callback(lambda f: on_done(event, f))
+
+        self.executor.submit(self.__run, event, done)
+
+    def __run(self, event: SlackEvent, done: Future):
+
+        #
+        # A handler that has to wait on something, like an upload waiting for
+        # its workspace's Slack rate limit, returns a future instead, and the
+        # stage is done when it is. The thread is free for the next event
+        # meanwhile.
+        #
+
+        try:
+            result = self.handler(event)
+        except BaseException as e:
+            self.__finish(event, done, e)
+
+            return
+
+        if isinstance(result, Future):
+            result.add_done_callback(lambda f: self.__finish(event, done, f.exception()))
+        else:
+            self.__finish(event, done, None)
+
+    def __finish(self, event: SlackEvent, done: Future, exception: Optional[BaseException]):
+        with self.lock:
+            self.pending -= 1
+
+        if exception:
+            done.set_exception(exception)
+
+            return
+
+        event.set_stage(self.stage)
+
+        done.set_result(None)
+
+class Pipeline:
+
+    #
+    # Moves each event through its stages:
+    #
+    # - submit: start the job with the vendor (or pick up the job we already started)
+    # - await: wait for the vendor to finish, which is handled by the shared poller,
+    #   and fail the event if the job fails or misses its deadline
+    # - download: fetch the generated images
+    # - transcode: optionally re-encode them into something smaller to upload
+    # - upload: post the images back to Slack, or in pass-through mode, stream
+    #   them from the vendor to Slack without downloading them first
+    # - finalize: mark the event as processed
+    #
+    # Every stage except await has its own pool of threads, so a slow Slack upload
+    # doesn't hold up the next vendor submission, and downloads and uploads happen
+    # while other jobs are still generating.
+    #
+    # An event that was already part way through when it was claimed skips the
+    # stages it had finished: once its images are downloaded, they aren't fetched
+    # again, and once they're posted to Slack, they aren't posted again.
+    #
+
+    def __init__(self, context: MueckContext, poll_scheduler: PollScheduler, on_finished: Callable[[SlackEvent, Optional[BaseException]], None]):
+        self.context = context
+        self.on_finished = on_finished
+
+        self.submit_stage = PipelineStage("submit", context.submit_concurrency, self.__submit, SlackEventStage.submitted)
+        self.download_stage = PipelineStage("download", context.download_concurrency, self.__download, SlackEventStage.downloaded)
+        self.transcode_stage = PipelineStage("transcode", context.transcode_processes, self.__transcode, SlackEventStage.downloaded)
+        self.upload_stage = PipelineStage("upload", context.upload_concurrency, self.__upload, SlackEventStage.uploaded)
+        self.finalize_stage = PipelineStage("finalize", context.finalize_concurrency, self.__finalize, SlackEventStage.processed)
+
+        self.transcoder = ImageTranscoder(context)
+
+        self.next_stages: Dict[str, Optional[PipelineStage]] = {
+            self.download_stage.name: self.transcode_stage if self.transcoder.enabled else self.upload_stage,
+            self.transcode_stage.name: self.upload_stage,
+            self.upload_stage.name: self.finalize_stage,
+            self.finalize_stage.name: None,
+        }
+
+        self.poller = JobPoller(context, poll_scheduler, self.__on_job_complete, self.on_finished)
+
+    def start(self):
+        self.poller.start()
+
+    def submit(self, event: SlackEvent):
+        self.submit_stage.submit(event, self.__on_submitted)
+
+    def poll_now(self, event_id: Optional[int] = None):
+        self.poller.poll_now(event_id)
+
+    def get_stage_depths(self) -> Dict[str, int]:
+        return {
+            "submit": self.submit_stage.pending,
+            "await": self.poller.pending,
+            "download": self.download_stage.pending,
+            "transcode": self.transcode_stage.pending,
+            "upload": self.upload_stage.pending,
+            "finalize": self.finalize_stage.pending,
+        }
+
+    def __submit(self, event: SlackEvent):
+        if event.stage == SlackEventStage.uploaded:
+            return
+
+        if event.stage == SlackEventStage.downloaded:
+            event.restore_downloaded_images()
+
+            return
+
+        event.process_event()
+
+    def __download(self, event: SlackEvent):
+        event.save_images()
+
+    def __transcode(self, event: SlackEvent):
+        self.transcoder.transcode(event.image_generator.images)
+
+    def __upload(self, event: SlackEvent) -> Future:
+        if self.__streams_to_slack(event):
+            return event.stream_images_to_slack(self.upload_stage.executor)
+
+        return event.reply_with_images(self.upload_stage.executor)
+
+    def __streams_to_slack(self, event: SlackEvent) -> bool:
+        images = event.image_generator.images
+
+        return self.context.passthrough and not all(image.filename for image in images)
+
+    def __finalize(self, event: SlackEvent):
+        event.mark_event_as_processed()
+
+    def __on_submitted(self, event: SlackEvent, future: Future):
+        if future.exception():
+            self.on_finished(event, future.exception())
+
+            return
+
+        if event.stage == SlackEventStage.uploaded:
+            next_stage = self.finalize_stage
+        elif event.stage == SlackEventStage.downloaded:
+            next_stage = self.next_stages[self.download_stage.name]
+        else:
+            next_stage = None
+
+        if next_stage:
+            next_stage.submit(event, self.__on_stage_done(next_stage))
+
+            return
+
+        # A job reused from the cache is already complete, so there's nothing to wait for.
+
+        if event.image_generator.status == "complete":
+            self.__on_job_complete(event)
+
+            return
+
+        self.poller.watch(event)
+
+    def __on_job_complete(self, event: SlackEvent):
+
+        # Called from the poller's thread, so hand the rest of the work to the download stage.
+
+        event.set_stage(SlackEventStage.completed)
+
+        #
+        # In pass-through mode the upload stage fetches the images itself, unless
+        # they're reused from the cache and already on disk.
+        #
+
+        if self.__streams_to_slack(event):
+            first_stage = self.upload_stage
+        else:
+            first_stage = self.download_stage
+
+        first_stage.submit(event, self.__on_stage_done(first_stage))
+
+    def __on_stage_done(self, stage: PipelineStage) -> Callable[[SlackEvent, Future], None]:
+        def on_done(event: SlackEvent, future: Future):
+            exception = future.exception()
+
+            next_stage = self.next_stages[stage.name]
+
+            if exception or next_stage is None:
+                self.on_finished(event, exception)
+
+                return
+
+            next_stage.submit(event, self.__on_stage_done(next_stage))
+
+        return on_done
\ No newline at end of file
@@ -0,0 +1,124 @@
+import threading
+
+from typing import Dict, Optional, Tuple
+
+from lib.context import MueckContext
+from lib.generators.base import ImageGenerator
+from lib.models.generated_image import ModelVendor
+from lib.store.slack_event import SlackEventStore
+
+MIN_POLL_SECONDS = 1.0
+MAX_POLL_SECONDS = 30.0
+
+# Used until we've seen enough jobs to know better.
+
+DEFAULT_JOB_SECONDS = 60.0
+DEFAULT_SECONDS_PER_QUEUE_RANK = 5.0
+
+# How much weight each new observation gets in the running averages.
+
+SMOOTHING = 0.2
+
+class PollScheduler:
+
+    #
+    # Decides how long to wait before polling a job's status again. We estimate
+    # when the job will finish -- from its position in the vendor's queue while
+    # it's waiting, and from how long that vendor's jobs usually take once it's
+    # running -- and poll more often the closer we get to that estimate.
+    #
+
+    def __init__(self, context: MueckContext, store: Optional[SlackEventStore] = None):
+        self.context = context
+
+        if store is None:
+            store = SlackEventStore(context)
+
+        self.store = store
+        self.lock = threading.Lock()
+
+        self.job_seconds: Dict[ModelVendor, float] = {}
+        self.seconds_per_queue_rank: Dict[ModelVendor, float] = {}
+
+        # The last queue rank we saw for each job, and when we saw it.
+
+        self.queue_observations: Dict[str, Tuple[int, float]] = {}
+
+    def next_interval(self, image_generator: ImageGenerator, elapsed: float) -> float:
+        with self.lock:
+            model_vendor = image_generator.model_vendor
+            status = image_generator.status
+
+            if status == "created":
+                return MIN_POLL_SECONDS * 2
+
+            if status == "queued" and image_generator.queue_position > 0:
+                self.__observe_queue_rank(image_generator, elapsed)
+
+                seconds_per_rank = self.seconds_per_queue_rank.get(model_vendor, DEFAULT_SECONDS_PER_QUEUE_RANK)
+                remaining = image_generator.queue_position * seconds_per_rank
+            else:
+                remaining = self.__get_job_seconds(model_vendor) - elapsed
+
+            #
+            # Wait half of the time we expect is left, so we close in on the
+            # estimate. Once a job is overdue, back off gradually instead of
+            # hammering the vendor.
+            #
+
+            if remaining > 0:
+                interval = remaining / 2
+            else:
+                interval = -remaining / 4
+
+        return min(MAX_POLL_SECONDS, max(MIN_POLL_SECONDS, interval))
+
+    def record_completion(self, image_generator: ImageGenerator, elapsed: float):
+        with self.lock:
+            model_vendor = image_generator.model_vendor
+
+            job_seconds = self.__get_job_seconds(model_vendor)
+
+            self.job_seconds[model_vendor] = (1 - SMOOTHING) * job_seconds + SMOOTHING * elapsed
+            self.queue_observations.pop(image_generator.id, None)
+
+    def forget(self, image_generator: ImageGenerator):
+
+        # For jobs we've given up on, which never reach record_completion.
+
+        with self.lock:
+            self.queue_observations.pop(image_generator.id, None)
+
+    def __get_job_seconds(self, model_vendor: ModelVendor) -> float:
+        if model_vendor not in self.job_seconds:
+            job_seconds = self.store.get_typical_job_seconds(model_vendor)
+
+            if job_seconds is None:
+                job_seconds = DEFAULT_JOB_SECONDS
+
+            self.context.logger.debug(f"model_vendor={model_vendor}, typical_job_seconds={job_seconds}")
+
+            self.job_seconds[model_vendor] = job_seconds
+
+        return self.job_seconds[model_vendor]
+
+    def __observe_queue_rank(self, image_generator: ImageGenerator, elapsed: float):
+        model_vendor = image_generator.model_vendor
+        queue_position = image_generator.queue_position
+
+        previous = self.queue_observations.get(image_generator.id)
+
+        self.queue_observations[image_generator.id] = (queue_position, elapsed)
+
+        if not previous:
+            return
+
+        (previous_position, previous_elapsed) = previous
+
+        if queue_position >= previous_position:
+            return
+
+        sample = (elapsed - previous_elapsed) / (previous_position - queue_position)
+        seconds_per_rank = self.seconds_per_queue_rank.get(model_vendor, DEFAULT_SECONDS_PER_QUEUE_RANK)
+
+        self.seconds_per_queue_rank[model_vendor] = (1 - SMOOTHING) * seconds_per_rank + SMOOTHING * sample
\ No newline at end of file
@@ -1,5 +1,4 @@
 import json
-import requests
 
 from datetime import datetime
 from urllib.parse import urlencode
@@ -78,7 +77,7 @@ class SlackAuthorization:
 
         url = "https://slack.com/api/oauth.v2.access?" + urlencode(params)
 
-        r = requests.post(url)
+        r = self.context.http.post(url)
 
         response = r.json()
 
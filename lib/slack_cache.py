@@ -0,0 +1,143 @@
+import threading
+import time
+
+from collections import OrderedDict
+from slack_sdk.web import WebClient
+from typing import Generic, Hashable, Optional, TypeVar
+
+from lib.models.slack_client import SlackClientRecord
+from lib.models.slack_integration import SlackIntegrationRecord
+
+T = TypeVar("T")
+
+# Slack retries an event for a few minutes at most, so this comfortably covers every retry.
+
+SEEN_EVENTS_SIZE = 10000
+SEEN_EVENTS_TTL = 3600
+
+class TtlLruCache(Generic[T]):
+
+    #
+    # A thread-safe cache that holds at most max_size entries, dropping the
+    # least recently used one when it's full, and forgets entries once they're
+    # older than the TTL.
+    #
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.entries: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[T]:
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if not entry:
+                return None
+
+            (expires, value) = entry
+
+            if expires < time.monotonic():
+                del self.entries[key]
+
+                return None
+
+            self.entries.move_to_end(key)
+
+            return value
+
+    def put(self, key: Hashable, value: T):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class SlackCache:
+
+    #
+    # Keeps Slack integrations, Slack clients (and so their signing secrets) and
+    # ready-made WebClients in memory, so handling an event doesn't have to go to
+    # the database. Integrations are cached by ID and by app ID. It also remembers
+    # which events we've recently saved, so retried deliveries can be dropped.
+    #
+    # When an integration changes, a trigger sends a notification that every
+    # process listens for, and the integration is dropped from the cache. See
+    # schema/init.sql.
+    #
+
+    def __init__(self, max_size: int, ttl: float):
+        self.integrations: TtlLruCache[SlackIntegrationRecord] = TtlLruCache(max_size, ttl)
+        self.clients: TtlLruCache[SlackClientRecord] = TtlLruCache(max_size, ttl)
+        self.web_clients: TtlLruCache[WebClient] = TtlLruCache(max_size, ttl)
+
+        # Events we've already saved, keyed by app ID and Slack's event ID.
+
+        self.seen_events: TtlLruCache[bool] = TtlLruCache(SEEN_EVENTS_SIZE, SEEN_EVENTS_TTL)
+
+    def get_integration_by_id(self, slack_integration_id: int) -> Optional[SlackIntegrationRecord]:
+        return self.integrations.get(("id", slack_integration_id))
+
+    def get_integration_by_app_id(self, app_id: str) -> Optional[SlackIntegrationRecord]:
+        return self.integrations.get(("app_id", app_id))
+
+    def put_integration(self, record: SlackIntegrationRecord):
+        self.integrations.put(("id", record.id), record)
+        self.integrations.put(("app_id", record.app_id), record)
+
+    def get_client(self, slack_client_id: int) -> Optional[SlackClientRecord]:
+        return self.clients.get(slack_client_id)
+
+    def put_client(self, record: SlackClientRecord):
+        self.clients.put(record.id, record)
+
+    def get_web_client(self, record: SlackIntegrationRecord) -> WebClient:
+
+        # Keyed on the token too, so a reinstalled integration gets a fresh client.
+
+        key = (record.id, record.access_token)
+
+        web_client = self.web_clients.get(key)
+
+        if not web_client:
+            web_client = WebClient(token=record.access_token)
+
+            self.web_clients.put(key, web_client)
+
+        return web_client
+
+    def has_seen_event(self, app_id: str, event_id: str) -> bool:
+        return bool(self.seen_events.get((app_id, event_id)))
+
+    def mark_event_seen(self, app_id: str, event_id: str):
+        self.seen_events.put((app_id, event_id), True)
+
+    def invalidate_integration(self, payload: Optional[str] = None):
+
+        #
+        # The payload is the integration's ID and app ID, separated by a colon.
+        # Without one -- e.g. after we've lost the connection and may have missed
+        # notifications -- everything is dropped.
+        #
+
+        if not payload:
+            self.integrations.clear()
+            self.web_clients.clear()
+
+            return
+
+        (slack_integration_id, _separator, app_id) = payload.partition(":")
+
+        self.integrations.invalidate(("id", int(slack_integration_id)))
+        self.integrations.invalidate(("app_id", app_id))
\ No newline at end of file
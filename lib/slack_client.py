@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+from typing import Optional
+
 from lib.context import MueckContext
 from lib.models.slack_authorization import SlackOAuthState
 from lib.models.slack_client import SlackClientRecord
-from lib.store.slack_client import SlackClientStore
+from lib.store.slack_client import AsyncSlackClientStore, SlackClientStore
 
 def verify_slack_event() -> bool:
     return True
@@ -11,8 +13,29 @@ def verify_slack_event() -> bool:
 class SlackClient:
     @classmethod
     def from_id(cls, context, slack_client_id: int) -> SlackClient:
-        store = SlackClientStore(context)
-        record = store.get_slack_client_by_id(slack_client_id)
+        record = context.slack_cache.get_client(slack_client_id)
+
+        if not record:
+            store = SlackClientStore(context)
+            record = store.get_slack_client_by_id(slack_client_id)
+
+            if record:
+                context.slack_cache.put_client(record)
+
+        return cls(context, record)
+
+    @classmethod
+    async def from_id_async(cls, context, slack_client_id: int) -> Optional[SlackClient]:
+        record = context.slack_cache.get_client(slack_client_id)
+
+        if not record:
+            store = AsyncSlackClientStore(context)
+            record = await store.get_slack_client_by_id(slack_client_id)
+
+            if not record:
+                return None
+
+            context.slack_cache.put_client(record)
 
         return cls(context, record)
 
@@ -0,0 +1,255 @@
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Executor, Future
+from logging import Logger
+from slack_sdk.errors import SlackApiError
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+#
+# Slack's rate limits for the methods we call, in calls per minute per
+# workspace. Anything not listed gets Tier 2, the lowest tier we use.
+#
+
+METHOD_RATES = {
+    "reactions.add": 50,                    # Tier 3
+    "files.getUploadURLExternal": 100,      # Tier 4
+    "files.completeUploadExternal": 100,    # Tier 4
+}
+
+DEFAULT_RATE = 20
+
+# Slack allows short bursts over the rate, so a bucket holds this many seconds' worth of calls.
+
+BURST_SECONDS = 10
+
+# How many times a call that keeps getting rate limited is tried before we give up on it.
+
+MAX_ATTEMPTS = 5
+
+class TokenBucket:
+
+    #
+    # Refills at the method's rate, up to BURST_SECONDS' worth of calls. When
+    # Slack sends a Retry-After, the bucket pauses until it's passed. Buckets
+    # are only used under the dispatcher's lock.
+    #
+
+    def __init__(self, rate_per_minute: int):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+
+        # How long until there's a token to take. 0 means there's one now.
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+
+        return max(wait, self.paused_until - now, 0.0)
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class SlackCall:
+    def __init__(self, workspace: Hashable, method: str, send: Callable[[], Any], executor: Optional[Executor], key: Optional[Hashable] = None):
+        self.workspace = workspace
+        self.method = method
+        self.send = send
+        self.executor = executor
+        self.key = key
+
+        self.future = Future()
+        self.attempts = 0
+
+class SlackDispatcher:
+
+    #
+    # Every call we make to the Slack Web API goes through here, so we stay
+    # within each workspace's rate limits instead of finding out from a 429.
+    # There's a token bucket per workspace and method, and calls wait in a
+    # single queue. The dispatcher's threads take the first call whose bucket
+    # has a token, and leave the rest where they are, so a workspace that's
+    # used up its rate only delays its own calls. When nothing's ready, the
+    # threads wait until the first bucket refills. A call that's rate limited
+    # anyway goes back in the queue until Slack's Retry-After has passed.
+    #
+    # submit() returns a future for the call's result. The call is made on the
+    # executor it's given, for uploads, which run on the upload stage's threads,
+    # or else on the dispatcher's own threads. Either way, no thread is held
+    # while the call waits its turn.
+    #
+    # post() is for status reactions, which nothing waits on. Posting under a key
+    # that's still waiting replaces the older call, so a job that moves from
+    # queued to running before we've said it was queued only gets the newer
+    # reaction.
+    #
+
+    def __init__(self, logger: Logger, threads: int):
+        self.logger = logger
+        self.threads = max(1, threads)
+
+        self.buckets: Dict[Tuple[Hashable, str], TokenBucket] = {}
+
+        self.queue: Deque[SlackCall] = deque()
+        self.posted: Dict[Hashable, SlackCall] = {}
+        self.condition = threading.Condition()
+        self.started = False
+
+    def submit(self, workspace: Hashable, method: str, send: Callable[[], Any], executor: Optional[Executor] = None) -> Future:
+        call = SlackCall(workspace, method, send, executor)
+
+        with self.condition:
+            self.__enqueue(call)
+
+        return call.future
+
+    def post(self, key: Hashable, workspace: Hashable, method: str, send: Callable[[], None]):
+        with self.condition:
+
+            # Replacing a call that's already waiting keeps its place in line.
+
+            waiting = self.posted.get(key)
+
+            if waiting:
+                waiting.send = send
+
+                return
+
+            call = SlackCall(workspace, method, send, None, key)
+            call.future.add_done_callback(self.__log_failure(call))
+
+            self.posted[key] = call
+            self.__enqueue(call)
+
+    def __enqueue(self, call: SlackCall, first: bool = False):
+        if not self.started:
+            for i in range(self.threads):
+                threading.Thread(target=self.__run, name=f"slack-dispatcher-{i}", daemon=True).start()
+
+            self.started = True
+
+        if first:
+            self.queue.appendleft(call)
+        else:
+            self.queue.append(call)
+
+        self.condition.notify_all()
+
+    def __get_bucket(self, workspace: Hashable, method: str) -> TokenBucket:
+        bucket = self.buckets.get((workspace, method))
+
+        if not bucket:
+            bucket = TokenBucket(METHOD_RATES.get(method, DEFAULT_RATE))
+
+            self.buckets[(workspace, method)] = bucket
+
+        return bucket
+
+    def __take_ready_call(self) -> Tuple[Optional[SlackCall], Optional[float]]:
+
+        #
+        # Returns the first call in the queue whose bucket has a token, having
+        # taken it. If there isn't one, returns how long until the first bucket
+        # with a call waiting will have one, or None if the queue is empty.
+        #
+
+        now = time.monotonic()
+        waits: Dict[Tuple[Hashable, str], float] = {}
+
+        for call in self.queue:
+            bucket_key = (call.workspace, call.method)
+
+            if bucket_key in waits:
+                continue
+
+            bucket = self.__get_bucket(call.workspace, call.method)
+            waits[bucket_key] = bucket.wait_time(now)
+
+            if waits[bucket_key] <= 0:
+                bucket.take()
+
+                self.queue.remove(call)
+
+                if call.key is not None and self.posted.get(call.key) is call:
+                    del self.posted[call.key]
+
+                return (call, None)
+
+        return (None, min(waits.values()) if waits else None)
+
+    def __run(self):
+        while True:
+            with self.condition:
+                (call, wait) = self.__take_ready_call()
+
+                while not call:
+                    self.condition.wait(wait)
+
+                    (call, wait) = self.__take_ready_call()
+
+            if call.executor:
+                call.executor.submit(self.__send, call)
+            else:
+                self.__send(call)
+
+    def __send(self, call: SlackCall):
+        try:
+            result = call.send()
+        except SlackApiError as e:
+            call.attempts += 1
+
+            if e.response.status_code != 429 or call.attempts >= MAX_ATTEMPTS:
+                call.future.set_exception(e)
+
+                return
+
+            retry_after = float(e.response.headers.get("Retry-After", e.response.headers.get("retry-after", 1)))
+
+            self.logger.warning(f"Rate limited by Slack: workspace={call.workspace}, method={call.method}, retry_after={retry_after}")
+
+            self.__retry(call, retry_after)
+
+            return
+        except BaseException as e:
+            call.future.set_exception(e)
+
+            return
+
+        call.future.set_result(result)
+
+    def __retry(self, call: SlackCall, retry_after: float):
+        with self.condition:
+            self.__get_bucket(call.workspace, call.method).pause(retry_after)
+
+            #
+            # A status reaction that's been posted again while this one was out
+            # is superseded by the newer one, so there's nothing to retry.
+            #
+
+            if call.key is not None:
+                if call.key in self.posted:
+                    call.future.set_result(None)
+
+                    return
+
+                self.posted[call.key] = call
+
+            self.__enqueue(call, first=True)
+
+    def __log_failure(self, call: SlackCall) -> Callable[[Future], None]:
+        def on_done(future: Future):
+            if future.exception():
+                self.logger.error(f"Failed to call Slack: workspace={call.workspace}, method={call.method}, key={call.key}: {future.exception()}")
+
+        return on_done
\ No newline at end of file
@@ -4,26 +4,38 @@ import datetime
 import hashlib
 import hmac
 import json
+import os
 import re
-import requests
 
-from PIL import Image
+from concurrent.futures import Executor, Future
+from typing import List, Optional
 from slack_sdk.web import WebClient
-from slack_sdk.errors import SlackApiError
 
 from lib.context import MueckContext
 from lib.generators.base import ImageGenerator
+from lib.generators.cached import CachedGeneration
 from lib.generators.civit import CivitAI
 from lib.generators.tensor_art import TensorArtJob
+from lib.futures import then
+from lib.generation_cache import GenerationCache, compute_cache_key
+from lib.image_metadata import read_image_metadata
+from lib.image_store import ImageStore
 from lib.slack_client import SlackClient
+from lib.slack_passthrough import PassThroughUpload, PassThroughUploader
 from lib.slack_integration import SlackIntegration
+from lib.vendor_callback import get_callback_url
 
-from lib.models.slack_event import SlackEventRecord
-from lib.models.generated_image import ImageGenerationRequest, ModelVendor
-from lib.store.slack_event import SlackEventStore
+from lib.models.slack_event import SlackEventRecord, SlackEventStage
+from lib.models.generated_image import GeneratedImage, ImageGenerationRequest, ModelVendor
+from lib.models.image_metadata import ImageMetadata
+from lib.store.slack_event import AsyncSlackEventStore, SlackEventStore
 
 DEFAULT_MODEL_VENDOR = ModelVendor.tensor_art
 
+# Direct messages jump ahead of mentions in channels.
+
+DIRECT_MESSAGE_PRIORITY = 1
+
 class SlackEvent:
     @classmethod
     def from_verified_event(
@@ -31,13 +43,10 @@ class SlackEvent:
         context: MueckContext,
         slack_signature: str,
         verification_string: str,
-        event_body: dict
+        event_body: dict,
+        raw_event: Optional[str] = None
     ) -> SlackEvent:
         app_id = event_body["api_app_id"]
-        channel = event_body["event"]["channel"]
-        request_ts = event_body["event"]["ts"]
-        event_ts = event_body["event"]["event_ts"]
-        thread_ts = event_body["event"].get("thread_ts", event_ts)
 
         #
         # Get the Slack integration and client. We need the integration
@@ -53,6 +62,63 @@ class SlackEvent:
 
         slack_client = SlackClient.from_id(context, slack_integration.slack_client_id)
 
+        return cls.__from_verified_integration(
+            context,
+            slack_integration,
+            slack_client,
+            slack_signature,
+            verification_string,
+            event_body,
+            raw_event
+        )
+
+    @classmethod
+    async def from_verified_event_async(
+        cls,
+        context: MueckContext,
+        slack_signature: str,
+        verification_string: str,
+        event_body: dict,
+        raw_event: Optional[str] = None
+    ) -> SlackEvent:
+
+        # The same as from_verified_event, without blocking the event loop on the database.
+
+        app_id = event_body["api_app_id"]
+
+        slack_integration = await SlackIntegration.from_app_id_async(context, app_id)
+
+        if not slack_integration:
+            raise Exception("Slack integration not found.")
+
+        slack_client = await SlackClient.from_id_async(context, slack_integration.slack_client_id)
+
+        return cls.__from_verified_integration(
+            context,
+            slack_integration,
+            slack_client,
+            slack_signature,
+            verification_string,
+            event_body,
+            raw_event
+        )
+
+    @classmethod
+    def __from_verified_integration(
+        cls,
+        context: MueckContext,
+        slack_integration: SlackIntegration,
+        slack_client: Optional[SlackClient],
+        slack_signature: str,
+        verification_string: str,
+        event_body: dict,
+        raw_event: Optional[str] = None
+    ) -> SlackEvent:
+        channel = event_body["event"]["channel"]
+        request_ts = event_body["event"]["ts"]
+        event_ts = event_body["event"]["event_ts"]
+        thread_ts = event_body["event"].get("thread_ts", event_ts)
+
         if not slack_client:
             raise Exception("Slack client not found.")
 
@@ -81,7 +147,11 @@ class SlackEvent:
             thread_ts=thread_ts,
             image_generation_request_id=None,
             created=created,
-            processed=None
+            processed=None,
+            app_id=event_body["api_app_id"],
+            slack_event_id=event_body.get("event_id"),
+            raw_event=raw_event,
+            priority=cls.__get_event_priority(event_body),
         )
 
         return cls(context, slack_event_record)
@@ -110,21 +180,35 @@ class SlackEvent:
             thread_ts=thread_ts,
             image_generation_request_id=None,
             created=created,
-            processed=None
+            processed=None,
+            app_id=event_body["api_app_id"],
+            slack_event_id=event_body.get("event_id"),
+            priority=cls.__get_event_priority(event_body),
         )
 
         return cls(context, slack_event_record)
 
     @classmethod
-    def from_next_unprocessed(cls, context: MueckContext) -> SlackEvent:
+    def claim_unprocessed(cls, context: MueckContext, limit: int) -> List[SlackEvent]:
         store = SlackEventStore(context)
 
-        slack_event_record = store.get_next_unprocessed_event()
+        slack_event_records = store.claim_unprocessed_events(
+            context.worker_id,
+            limit,
+            context.worker_lease_seconds,
+            context.workspace_concurrency,
+            context.account_concurrency,
+            context.priority_aging_seconds
+        )
 
-        if not slack_event_record:
-            return None
+        return [cls(context, record, store=store) for record in slack_event_records]
+
+    @staticmethod
+    def __get_event_priority(event_body: dict) -> int:
+        if event_body["event"].get("channel_type") == "im":
+            return DIRECT_MESSAGE_PRIORITY
 
-        return cls(context, slack_event_record, store=store)
+        return 0
 
     @staticmethod
     def verify_slack_signature(context: MueckContext, slack_signature: str, verification_string: str, signing_secret: str) -> bool:
@@ -162,10 +246,21 @@ class SlackEvent:
             store = SlackEventStore(context)
 
         self.store = store
+        self.image_store = ImageStore(context)
+        self.generation_cache = GenerationCache(context, store)
+        self.passthrough_uploader = PassThroughUploader(context)
 
         self.model_vendor = DEFAULT_MODEL_VENDOR
         self.image_generator: Optional[ImageGenerator] = None
 
+        #
+        # How far the worker's pipeline has got with this event. It's saved
+        # as each stage finishes, so an event claimed again after a crash
+        # starts where it left off.
+        #
+
+        self.stage = slack_event_record.stage
+
         self.__slack_integration = None
         self.__slack_client = None
 
@@ -201,7 +296,7 @@ class SlackEvent:
     @property
     def slack_client(self) -> WebClient:
         if not self.__slack_client:
-            self.__slack_client = WebClient(token=self.slack_integration.access_token)
+            self.__slack_client = self.context.slack_cache.get_web_client(self.slack_integration.record)
 
         return self.__slack_client
 
@@ -209,26 +304,55 @@ class SlackEvent:
     def image_generation_request_id(self) -> int:
         return self.record.image_generation_request_id
 
-    def save_event(self):
+    def save_event(self) -> bool:
+
+        # Returns False if this is a redelivery of an event we've already saved.
+
         slack_event_record = self.store.save_event(self.record)
 
+        self.mark_event_seen()
+
+        if not slack_event_record:
+            return False
+
+        self.record = slack_event_record
+
+        return True
+
+    async def save_event_async(self) -> bool:
+        store = AsyncSlackEventStore(self.context)
+
+        slack_event_record = await store.save_event(self.record)
+
+        self.mark_event_seen()
+
+        if not slack_event_record:
+            return False
+
         self.record = slack_event_record
 
+        return True
+
+    def mark_event_seen(self):
+        if self.record.app_id and self.record.slack_event_id:
+            self.context.slack_cache.mark_event_seen(self.record.app_id, self.record.slack_event_id)
+
     def process_event(self):
         image_generator: Optional[ImageGenerator] = None
+        image_generation_request: Optional[ImageGenerationRequest] = None
 
         if self.record.image_generation_request_id:
+            image_generation_request = self.store.get_image_generation_request(self.image_generation_request_id)
+
+            # If the last attempt failed at the vendor, there's nothing to resume. Start over.
+
+            if image_generation_request.status == "error":
+                image_generation_request = None
+
+        if image_generation_request:
             # Resume a job already in progress.
 
-            image_generation_request = self.store.get_image_generation_request(self.image_generation_request_id)
-            model_vendor = image_generation_request.model_vendor
-            job_id = image_generation_request.job_id
-
-            if model_vendor == ModelVendor.tensor_art:
-                image_generator = TensorArtJob(self.context, job_id=job_id)
-            elif model_vendor == ModelVendor.civitai:
-                token = image_generation_request.token
-                image_generator = CivitAI(self.context, job_id=job_id, token=token)
+            image_generator = self.__resume_image_generator(image_generation_request)
         else:
             # Start a new job.
 
@@ -243,35 +367,127 @@ class SlackEvent:
             else:
                 raise Exception(f"Unknown model vendor: {self.model_vendor}")
 
-            image_generator.execute()
+            image_generator.callback_url = get_callback_url(self.context, self.model_vendor.value, self.id)
 
-            self.record.image_generation_request_id = self.store.save_image_generation_request(self.id, image_generator)
+            cache_key = compute_cache_key(image_generator)
+
+            if cache_key:
+                with self.generation_cache.lock(cache_key):
+                    image_generator = self.__start_cacheable_job(image_generator, cache_key)
+            else:
+                image_generator.execute()
+
+                self.record.image_generation_request_id = self.store.save_image_generation_request(self.id, image_generator)
 
             self.reply_with_status(image_generator.status)
 
         self.image_generator = image_generator
 
+    def __start_cacheable_job(self, image_generator: ImageGenerator, cache_key: str) -> ImageGenerator:
+
+        #
+        # If we've made this exact image before, reuse it. If the same request
+        # is already running at the vendor, wait on that job. Otherwise, start
+        # a new one.
+        #
+
+        cached_generation = self.generation_cache.find_completed(cache_key)
+
+        if cached_generation:
+            image_generator = cached_generation
+        else:
+            in_flight_request = self.generation_cache.find_in_flight(cache_key)
+
+            if in_flight_request:
+                prompt = image_generator.prompt
+
+                image_generator = self.__resume_image_generator(in_flight_request)
+                image_generator.prompt = prompt
+
+                #
+                # A job that's finished but not downloaded yet still needs its
+                # image URLs from the vendor, so let the poller fetch them.
+                #
+
+                if in_flight_request.status == "complete":
+                    image_generator.status = "running"
+                else:
+                    image_generator.status = in_flight_request.status
+            else:
+                image_generator.execute()
+
+        self.record.image_generation_request_id = self.store.save_image_generation_request(self.id, image_generator, cache_key)
+
+        return image_generator
+
+    def __resume_image_generator(self, image_generation_request: ImageGenerationRequest) -> ImageGenerator:
+        model_vendor = image_generation_request.model_vendor
+        job_id = image_generation_request.job_id
+
+        if model_vendor == ModelVendor.tensor_art:
+            return TensorArtJob(self.context, job_id=job_id)
+        elif model_vendor == ModelVendor.civitai:
+            token = image_generation_request.token
+
+            return CivitAI(self.context, job_id=job_id, token=token)
+
+        raise Exception(f"Unknown model vendor: {model_vendor}")
+
+    def set_stage(self, stage: SlackEventStage):
+
+        # Stages only ever move forward; a stage that's re-run on resume doesn't undo progress.
+
+        stages = list(SlackEventStage)
+
+        if stages.index(stage) <= stages.index(self.stage):
+            return
+
+        self.stage = stage
+
+        #
+        # A checkpoint only saves work if we're restarted, so failing to write one
+        # isn't worth failing the event over.
+        #
+
+        try:
+            self.store.update_event_stage(self.id, stage)
+        except Exception as e:
+            self.context.logger.error(f"Failed to save stage for event_id={self.id}, stage={stage.value}: {e}")
+
+    def restore_downloaded_images(self):
+
+        #
+        # Pick up an event whose images were downloaded before we were restarted.
+        # The images are already on disk and recorded against the request.
+        #
+
+        image_generation_request = self.store.get_image_generation_request(self.image_generation_request_id)
+        images = self.store.get_generated_images(self.image_generation_request_id)
+
+        self.image_generator = CachedGeneration(self.context, image_generation_request, images)
+
     def update_image_generation_request(self, update: ImageGenerationRequestUpdate):
         self.store.update_image_generation_request(self.image_generation_request_id, update)
 
     def save_images(self):
+
+        self.__clear_partial_images()
+
         for image in self.image_generator.images:
-            url = image.url
 
-            r = requests.get(url)
+            # Images reused from an earlier request are already on disk.
 
-            basename = f"{image.image_id}.png"
-            filename = f"{self.context.download_path}/{basename}"
+            if not image.filename:
+                (filename, sha256) = self.image_store.store_from_url(image.url)
 
-            with open(filename, "wb") as fp:
-                fp.write(r.content)
+                self.context.logger.debug(f"Stored image_id={image.image_id}, sha256={sha256}")
 
-            image.filename = filename
+                image.filename = filename
+                image.sha256 = sha256
 
-            if not image.seed:
-                seed = self.__get_image_seed(filename)
+            image.size = os.path.getsize(image.filename)
 
-                image.seed = seed
+            self.__apply_image_metadata(image)
 
             self.store.save_generated_image(self.image_generation_request_id, image)
 
@@ -286,37 +502,136 @@ class SlackEvent:
             emoji = "runner"
         elif status == "complete":
             emoji = "white_check_mark"
+        elif status == "error":
+            emoji = "x"
         else:
             emoji = "question"
 
-        try:
-            client.reactions_add(
+        #
+        # Sent in the background. If the job's status changes again before this
+        # one goes out, only the newer reaction is sent.
+        #
+
+        self.context.slack_dispatcher.post(
+            ("status", self.id),
+            self.record.slack_integration_id,
+            "reactions.add",
+            lambda: client.reactions_add(
                 channel=self.channel,
                 name=emoji,
                 timestamp=self.record.request_ts,
             )
-        except SlackApiError:
-            self.context.logger.error("Failed to add reaction to message.")
+        )
 
-    def reply_with_images(self):
+    def reply_with_images(self, executor: Executor) -> Future:
         client = self.slack_client
 
+        self.image_store.touch([image.filename for image in self.image_generator.images])
+
         file_uploads = [
             {
-                "file": image.filename,
+                "file": image.upload_filename or image.filename,
                 "title": f"seed:{image.seed}",
             } for image in self.image_generator.images
         ]
 
-        response = client.files_upload_v2(
-            file_uploads=file_uploads,
-            channel=self.channel,
-            thread_ts=self.thread_ts,
+        #
+        # files_upload_v2 finishes with files.completeUploadExternal, so it's
+        # limited at that rate. The upload is made on one of the executor's
+        # threads once the workspace has a call to spare.
+        #
+
+        return self.context.slack_dispatcher.submit(
+            self.record.slack_integration_id,
+            "files.completeUploadExternal",
+            lambda: client.files_upload_v2(
+                file_uploads=file_uploads,
+                channel=self.channel,
+                thread_ts=self.thread_ts,
+            ),
+            executor
+        )
+
+    def stream_images_to_slack(self, executor: Executor) -> Future:
+
+        #
+        # Pass-through mode: send the vendor's images straight to Slack without
+        # keeping a copy on disk. We still record each image, with no filename.
+        #
+
+        self.__clear_partial_images()
+
+        images = self.image_generator.images
+        uploads = self.passthrough_uploader.upload(self.slack_client, self.record.slack_integration_id, images, executor)
+
+        return then(uploads, lambda uploads: self.__share_streamed_images(images, uploads, executor))
+
+    def __share_streamed_images(self, images: List[GeneratedImage], uploads: List[PassThroughUpload], executor: Executor) -> Future:
+        for (image, upload) in zip(images, uploads):
+            image.sha256 = upload.sha256
+            image.size = upload.size
+
+            self.__apply_image_metadata(image, upload.metadata)
+
+            self.store.save_generated_image(self.image_generation_request_id, image)
+
+        files = [
+            {
+                "id": upload.file_id,
+                "title": f"seed:{image.seed}",
+            } for (image, upload) in zip(images, uploads)
+        ]
+
+        return self.context.slack_dispatcher.submit(
+            self.record.slack_integration_id,
+            "files.completeUploadExternal",
+            lambda: self.slack_client.files_completeUploadExternal(
+                files=files,
+                channel_id=self.channel,
+                thread_ts=self.thread_ts,
+            ),
+            executor
         )
 
+    def __clear_partial_images(self):
+
+        #
+        # If we were restarted part way through saving the images, whether by
+        # downloading or streaming them, some may already be recorded. Start the
+        # list again so none appear twice.
+        #
+
+        if self.record.stage == SlackEventStage.completed:
+            self.store.delete_generated_images(self.image_generation_request_id)
+
     def mark_event_as_processed(self):
         self.store.mark_event_as_processed(self.id)
 
+        self.stage = SlackEventStage.processed
+
+    def record_failure(self, exception: BaseException) -> bool:
+
+        #
+        # Put the event back in the queue to be retried after a backoff, unless
+        # it's out of attempts, in which case it goes to the dead-letter table
+        # and we tell the user. Returns True if we've given up on it.
+        #
+
+        attempts = self.store.record_event_failure(
+            self.id,
+            str(exception),
+            self.context.retry_base_seconds,
+            self.context.retry_max_seconds
+        )
+
+        if attempts < self.context.max_attempts:
+            return False
+
+        self.store.dead_letter_event(self.id)
+        self.reply_with_status("error")
+
+        return True
+
     def __extract_prompt_from_event(self) -> tuple[str, int]:
         bot_user_id = self.slack_integration.bot_user_id
 
@@ -339,7 +654,7 @@ class SlackEvent:
                                     m = re.match(r"^seed:(\d+)$", text["text"])
 
                                     if m:
-                                        seed = m.group(1)
+                                        seed = int(m.group(1))
 
                                         continue
 
@@ -353,15 +668,41 @@ class SlackEvent:
         else:
             self.model_vendor = ModelVendor.tensor_art
 
-    def __get_image_seed(self, filename: str) -> str:
-        try:
-            image = Image.open(filename)
+    def __apply_image_metadata(self, image: GeneratedImage, metadata: Optional[ImageMetadata] = None):
 
-            image.load()
+        #
+        # Fill in whatever the vendor didn't tell us about the image from the
+        # file's own headers. This never decodes the pixels.
+        #
+
+        if image.seed and image.width and image.height:
+            return
+
+        if not metadata and image.filename:
+            try:
+                metadata = read_image_metadata(image.filename)
+            except Exception as e:
+                self.context.logger.error(f"Failed to extract metadata from image: {e}", exc_info=True)
+
+                return
 
-            prompt = json.loads(image.info["prompt"])
+        if not metadata:
+            self.context.logger.error(f"No metadata found for image_id={image.image_id}")
+
+            return
+
+        if not image.width or not image.height:
+            image.width = metadata.width
+            image.height = metadata.height
+
+        if not image.seed:
+            image.seed = self.__get_image_seed(metadata)
+
+    def __get_image_seed(self, metadata: ImageMetadata) -> int:
+        try:
+            prompt = json.loads(metadata.text["prompt"])
         except Exception as e:
-            self.context.logger.error(f"Failed to extract metadata from image: {e}", exc_info=True)
+            self.context.logger.error(f"Failed to extract seed from image metadata: {e}")
 
             return 0
 
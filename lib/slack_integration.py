@@ -1,21 +1,49 @@
 from lib.context import MueckContext
 from lib.models.slack_integration import SlackIntegrationFilter, SlackIntegrationRecord
-from lib.store.slack_integration import SlackIntegrationStore
+from lib.store.slack_integration import AsyncSlackIntegrationStore, SlackIntegrationStore
 
 class SlackIntegration:
     @classmethod
     def from_id(cls, context: MueckContext, slack_integration_id: int):
-        store = SlackIntegrationStore(context)
-        filter = SlackIntegrationFilter(slack_integration_id=slack_integration_id)
-        record = store.get_slack_integration(filter)
+        record = context.slack_cache.get_integration_by_id(slack_integration_id)
+
+        if not record:
+            store = SlackIntegrationStore(context)
+            filter = SlackIntegrationFilter(slack_integration_id=slack_integration_id)
+            record = store.get_slack_integration(filter)
+
+            if record:
+                context.slack_cache.put_integration(record)
 
         return cls(context, record)
 
     @classmethod
     def from_app_id(cls, context: MueckContext, app_id: str):
-        store = SlackIntegrationStore(context)
-        filter = SlackIntegrationFilter(app_id=app_id)
-        record = store.get_slack_integration(filter)
+        record = context.slack_cache.get_integration_by_app_id(app_id)
+
+        if not record:
+            store = SlackIntegrationStore(context)
+            filter = SlackIntegrationFilter(app_id=app_id)
+            record = store.get_slack_integration(filter)
+
+            if record:
+                context.slack_cache.put_integration(record)
+
+        return cls(context, record)
+
+    @classmethod
+    async def from_app_id_async(cls, context: MueckContext, app_id: str):
+        record = context.slack_cache.get_integration_by_app_id(app_id)
+
+        if not record:
+            store = AsyncSlackIntegrationStore(context)
+            filter = SlackIntegrationFilter(app_id=app_id)
+            record = await store.get_slack_integration(filter)
+
+            if not record:
+                return None
+
+            context.slack_cache.put_integration(record)
 
         return cls(context, record)
 
@@ -47,4 +75,11 @@ class SlackIntegration:
     def create_integration(self):
         integration_id = self.integration_store.save_slack_integration(self.record)
 
-        self.record.id = integration_id
\ No newline at end of file
+        self.record.id = integration_id
+
+        #
+        # The trigger on slack_integration tells every other process to drop
+        # this integration from its cache; we don't need to wait for it here.
+        #
+
+        self.context.slack_cache.invalidate_integration(f"{integration_id}:{self.record.app_id}")
\ No newline at end of file
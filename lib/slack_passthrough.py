@@ -0,0 +1,146 @@
+import hashlib
+import tempfile
+
+from concurrent.futures import Executor, Future
+from pydantic import BaseModel
+from slack_sdk.web import WebClient
+from typing import BinaryIO, List, Optional
+
+from lib.context import MueckContext
+from lib.futures import gather
+from lib.image_metadata import read_image_metadata_from_bytes
+from lib.models.generated_image import GeneratedImage
+from lib.models.image_metadata import ImageMetadata
+
+CHUNK_SIZE = 64 * 1024
+
+# Enough of the start of an image to find its dimensions and text metadata.
+
+METADATA_PREFIX_SIZE = 256 * 1024
+
+# If the vendor doesn't tell us how big an image is, we have to read it all before we
+# can ask Slack for an upload URL. Up to this much is kept in memory; the rest spills to disk.
+
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+class PassThroughUpload(BaseModel):
+    file_id: str
+    sha256: str
+    size: int
+    metadata: Optional[ImageMetadata] = None
+
+class StreamingBody:
+
+    #
+    # A file-like request body that reads from the vendor's response as the
+    # upload asks for more, so only a chunk at a time is held in memory. It
+    # hashes the bytes and keeps the start of the image for its metadata on the
+    # way through. Having a length means requests sends a Content-Length instead
+    # of chunked encoding.
+    #
+
+    def __init__(self, source: BinaryIO, length: int):
+        self.source = source
+        self.length = length
+
+        self.hasher = hashlib.sha256()
+        self.prefix = bytearray()
+        self.bytes_read = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+
+        chunk = self.source.read(size)
+
+        self.hasher.update(chunk)
+        self.bytes_read += len(chunk)
+
+        if len(self.prefix) < METADATA_PREFIX_SIZE:
+            self.prefix += chunk[:METADATA_PREFIX_SIZE - len(self.prefix)]
+
+        return chunk
+
+class PassThroughUploader:
+
+    #
+    # Streams images from the vendor straight into Slack's external upload flow,
+    # without writing them to disk: ask Slack for an upload URL, send the bytes
+    # to it as they arrive from the vendor, and later complete the upload to
+    # share the files in the channel.
+    #
+    # Each image is queued with the Slack dispatcher as a files.getUploadURLExternal
+    # call, and streamed on one of the executor's threads once the workspace has
+    # a call to spare.
+    #
+
+    def __init__(self, context: MueckContext):
+        self.context = context
+
+    def upload(self, client: WebClient, slack_integration_id: int, images: List[GeneratedImage], executor: Executor) -> Future:
+
+        # Resolves with a PassThroughUpload for each image, in order.
+
+        return gather([
+            self.context.slack_dispatcher.submit(
+                slack_integration_id,
+                "files.getUploadURLExternal",
+                lambda image=image: self.__upload_image(client, image),
+                executor
+            ) for image in images
+        ])
+
+    def __upload_image(self, client: WebClient, image: GeneratedImage) -> PassThroughUpload:
+
+        # Ask for the image uncompressed, so the length we're told is the length we send.
+
+        headers = {"Accept-Encoding": "identity"}
+
+        with self.context.http.get(image.url, headers=headers, stream=True) as r:
+            r.raise_for_status()
+
+            length = r.headers.get("Content-Length")
+
+            if length is not None:
+                return self.__send(client, image, r.raw, int(length))
+
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    spool.write(chunk)
+
+                length = spool.tell()
+
+                spool.seek(0)
+
+                return self.__send(client, image, spool, length)
+
+    def __send(self, client: WebClient, image: GeneratedImage, source: BinaryIO, length: int) -> PassThroughUpload:
+
+        # The dispatcher has already counted this call against the workspace's rate limit.
+
+        response = client.files_getUploadURLExternal(filename=f"{image.image_id}.png", length=length)
+
+        upload_url = response["upload_url"]
+        file_id = response["file_id"]
+
+        body = StreamingBody(source, length)
+
+        r = self.context.http.post(upload_url, data=body, headers={"Content-Type": "application/octet-stream"})
+        r.raise_for_status()
+
+        try:
+            metadata = read_image_metadata_from_bytes(bytes(body.prefix))
+        except Exception as e:
+            self.context.logger.error(f"Failed to extract metadata from image_id={image.image_id}: {e}")
+
+            metadata = None
+
+        return PassThroughUpload(
+            file_id=file_id,
+            sha256=body.hasher.hexdigest(),
+            size=body.bytes_read,
+            metadata=metadata,
+        )
\ No newline at end of file
@@ -0,0 +1,17 @@
+import json
+
+#
+# orjson parses straight from bytes and is several times faster than the
+# standard library. It's optional; without it we fall back to json.
+#
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def parse_payload(raw_payload: bytes) -> dict:
+    if orjson:
+        return orjson.loads(raw_payload)
+
+    return json.loads(raw_payload)
\ No newline at end of file
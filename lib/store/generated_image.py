@@ -0,0 +1,138 @@
+from typing import List, Optional
+
+from lib.context import MueckContext
+
+class GeneratedImageStore:
+    def __init__(self, context: MueckContext):
+        self.context = context
+
+    def get_filename_by_sha256(self, sha256: str) -> Optional[str]:
+        query = """
+            SELECT
+                filename
+            FROM
+                generated_image
+            WHERE
+                sha256 = %s AND
+                evicted IS NULL
+            ORDER BY
+                id DESC
+            LIMIT
+                1
+        """
+
+        filename = None
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (sha256,))
+
+                for row in cursor:
+                    filename = row[0]
+
+        return filename
+
+    def count_references(self, sha256: str) -> int:
+        query = """
+            SELECT
+                COUNT(*)
+            FROM
+                generated_image
+            WHERE
+                sha256 = %s AND
+                evicted IS NULL
+        """
+
+        references = 0
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (sha256,))
+
+                for row in cursor:
+                    references = row[0]
+
+        return references
+
+    def touch(self, filenames: List[str]):
+        query = """
+            UPDATE
+                generated_image
+            SET
+                last_accessed = NOW()
+            WHERE
+                filename = ANY(%s) AND
+                evicted IS NULL
+        """
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (filenames,))
+
+    def get_files_over_budget(self, max_bytes: int, max_files: int) -> List[str]:
+
+        #
+        # Rank the files we still have from most to least recently used, and
+        # return everything past the point where we'd go over either budget.
+        # Several rows can share one file, so a file is as recent as its most
+        # recently used row. A budget of zero means no limit.
+        #
+
+        query = """
+            WITH files AS (
+                SELECT
+                    filename,
+                    MAX(last_accessed) AS last_accessed,
+                    MAX(size) AS size
+                FROM
+                    generated_image
+                WHERE
+                    filename IS NOT NULL AND
+                    evicted IS NULL
+                GROUP BY
+                    filename
+            ), ranked AS (
+                SELECT
+                    filename,
+                    last_accessed,
+                    SUM(COALESCE(size, 0)) OVER (ORDER BY last_accessed DESC, filename) AS cumulative_bytes,
+                    ROW_NUMBER() OVER (ORDER BY last_accessed DESC, filename) AS file_number
+                FROM
+                    files
+            )
+            SELECT
+                filename
+            FROM
+                ranked
+            WHERE
+                (%s > 0 AND cumulative_bytes > %s) OR
+                (%s > 0 AND file_number > %s)
+            ORDER BY
+                last_accessed ASC
+        """
+
+        filenames = []
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (max_bytes, max_bytes, max_files, max_files))
+
+                for row in cursor:
+                    filenames.append(row[0])
+
+        return filenames
+
+    def mark_evicted(self, filename: str):
+        query = """
+            UPDATE
+                generated_image
+            SET
+                evicted = NOW()
+            WHERE
+                filename = %s AND
+                evicted IS NULL
+        """
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (filename,))
\ No newline at end of file
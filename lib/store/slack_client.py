@@ -3,40 +3,43 @@ from typing import Optional
 from lib.context import MueckContext
 from lib.models.slack_client import SlackClientRecord
 
+GET_SLACK_CLIENT_BY_ID_QUERY = """
+    SELECT
+        id,
+        api_client_id,
+        api_client_secret,
+        signing_secret,
+        name,
+        created
+    FROM
+        slack_client
+    WHERE
+        id = %s
+"""
+
+def slack_client_record_from_row(row) -> SlackClientRecord:
+    return SlackClientRecord(
+        id=row[0],
+        api_client_id=row[1],
+        api_client_secret=row[2],
+        signing_secret=row[3],
+        name=row[4],
+        created=row[5]
+    )
+
 class SlackClientStore:
     def __init__(self, context: MueckContext):
         self.context = context
 
     def get_slack_client_by_id(self, slack_client_id: int) -> Optional[SlackClientRecord]:
-        query = """
-            SELECT
-                id,
-                api_client_id,
-                api_client_secret,
-                signing_secret,
-                name,
-                created
-            FROM
-                slack_client
-            WHERE
-                id = %s
-        """
-
         slack_client_record = None
 
         with self.context.dbh.pool.connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute(query, (slack_client_id,))
+                cursor.execute(GET_SLACK_CLIENT_BY_ID_QUERY, (slack_client_id,))
 
                 for row in cursor:
-                    slack_client_record = SlackClientRecord(
-                        id=row[0],
-                        api_client_id=row[1],
-                        api_client_secret=row[2],
-                        signing_secret=row[3],
-                        name=row[4],
-                        created=row[5]
-                    )
+                    slack_client_record = slack_client_record_from_row(row)
 
         return slack_client_record
 
@@ -71,13 +74,25 @@ class SlackClientStore:
                 cursor.execute(query, (state_id, account_id, slack_client_id,))
 
                 for row in cursor:
-                    slack_client_record = SlackClientRecord(
-                        id=row[0],
-                        api_client_id=row[1],
-                        api_client_secret=row[2],
-                        signing_secret=row[3],
-                        name=row[4],
-                        created=row[5]
-                    )
+                    slack_client_record = slack_client_record_from_row(row)
+
+        return slack_client_record
+
+class AsyncSlackClientStore:
+
+    # Looks up the signing secret the webhook verifies each event against.
+
+    def __init__(self, context: MueckContext):
+        self.context = context
+
+    async def get_slack_client_by_id(self, slack_client_id: int) -> Optional[SlackClientRecord]:
+        slack_client_record = None
+
+        async with self.context.async_dbh.pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(GET_SLACK_CLIENT_BY_ID_QUERY, (slack_client_id,))
+
+                async for row in cursor:
+                    slack_client_record = slack_client_record_from_row(row)
 
         return slack_client_record
\ No newline at end of file
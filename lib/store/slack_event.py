@@ -1,88 +1,345 @@
 import json
 
-from typing import Optional
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
 
 from lib.context import MueckContext
+from lib.event_listener import VENDOR_CALLBACK_CHANNEL
 
 from lib.generators.base import ImageGenerator
-from lib.models.slack_event import SlackEventRecord
-from lib.models.generated_image import GeneratedImage, ImageGenerationRequest, ImageGenerationRequestUpdate
+from lib.models.slack_event import SlackEventRecord, SlackEventStage
+from lib.models.generated_image import GeneratedImage, ImageGenerationRequest, ImageGenerationRequestUpdate, ModelVendor
+
+#
+# Slack delivers the same event more than once if we're slow to answer. The
+# unique index on app_id and slack_event_id means a redelivery inserts nothing
+# and returns no row.
+#
+
+SAVE_EVENT_QUERY = """
+    INSERT INTO
+        slack_event
+    (
+        slack_integration_id,
+        app_id,
+        slack_event_id,
+        event,
+        channel,
+        request_ts,
+        thread_ts,
+        priority,
+        created
+    ) VALUES (
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        NOW()
+    )
+    ON CONFLICT (app_id, slack_event_id) DO NOTHING
+    RETURNING
+        id,
+        created
+"""
+
+def save_event_values(slack_event_record: SlackEventRecord) -> tuple:
+
+    #
+    # Events from the webhook carry the payload exactly as Slack sent it, which
+    # Postgres can take as JSONB without us serializing the dictionary again.
+    #
+
+    if slack_event_record.raw_event is not None:
+        event = slack_event_record.raw_event
+    else:
+        event = json.dumps(slack_event_record.event)
+
+    return (
+        slack_event_record.slack_integration_id,
+        slack_event_record.app_id,
+        slack_event_record.slack_event_id,
+        event,
+        slack_event_record.channel,
+        slack_event_record.request_ts,
+        slack_event_record.thread_ts,
+        slack_event_record.priority
+    )
+
+#
+# Events whose job was already submitted to a vendor are resumed ahead of
+# everything else: the credits are spent, and they just need finishing. Every
+# other lane, however high its priority or however long it has aged, stays
+# below this one.
+#
+
+RESUMED_PRIORITY = 10
 
 class SlackEventStore:
     def __init__(self, context: MueckContext):
         self.context = context
 
-    def save_event(self, slack_event_record: SlackEventRecord) -> SlackEventRecord:
-        query = """
-            INSERT INTO
-                slack_event
-            (
-                slack_integration_id,
-                event,
-                channel,
-                request_ts,
-                thread_ts,
-                created
-            ) VALUES (
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                NOW()
-            )
-            RETURNING
-                id,
-                created
-        """
+    def save_event(self, slack_event_record: SlackEventRecord) -> Optional[SlackEventRecord]:
+
+        # Returns None if we've already saved this event.
+
+        saved = False
 
         with self.context.dbh.pool.connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute(query, (
-                    slack_event_record.slack_integration_id,
-                    json.dumps(slack_event_record.event),
-                    slack_event_record.channel,
-                    slack_event_record.request_ts,
-                    slack_event_record.thread_ts
-                ))
+                cursor.execute(SAVE_EVENT_QUERY, save_event_values(slack_event_record))
 
                 for row in cursor:
                     slack_event_record.id = row[0]
                     slack_event_record.created = row[1]
 
-        return slack_event_record
+                    saved = True
+
+        return slack_event_record if saved else None
+
+    def claim_unprocessed_events(
+        self,
+        worker_id: str,
+        limit: int,
+        lease_seconds: int,
+        workspace_concurrency: int = 0,
+        account_concurrency: int = 0,
+        priority_aging_seconds: int = 300
+    ) -> List[SlackEventRecord]:
+
+        #
+        # Lock the claimable rows that are next in line, skipping anything
+        # another worker has locked, and stamp them with our worker ID and a lease
+        # expiry. A row is claimable if it hasn't been processed and nobody holds
+        # a live lease on it, so events held by a worker that died become
+        # available again once the lease runs out. Events that failed wait out
+        # their retry backoff first.
+        #
+        # "Next in line" is weighted fair queuing across workspaces, not FIFO.
+        # Each workspace's events are numbered in order, counting on from
+        # however many it already has running, and divided by its weight. The
+        # lowest of those virtual finish times goes first. A workspace with 200
+        # queued prompts gets its share, but a small workspace's next event is
+        # always near the front.
+        #
+        # Fair queuing happens within priority lanes. Events that already have a
+        # job at a vendor are in the RESUMED_PRIORITY lane, ahead of everything
+        # else: the credits are spent, and they should finish before we spend
+        # credits on anything new. Every other event's base lane is its own
+        # priority (direct messages) plus its account's priority (paid tiers),
+        # held below RESUMED_PRIORITY - 1.
+        #
+        # So that nothing sits in a low lane forever, the oldest event of each
+        # workspace and base lane moves up one lane for every
+        # priority_aging_seconds it has been waiting, up to RESUMED_PRIORITY - 1.
+        # Only that event moves, so a workspace's backlog can't lift its newer
+        # events past other workspaces or past higher priority lanes.
+        #
+        # Within a workspace, events are numbered by lane before age, so a
+        # direct message in a capped workspace doesn't queue behind its backlog.
+        #
+        # Workspaces and accounts that have reached their concurrency cap are
+        # skipped until something finishes. Concurrent claims from different
+        # workers can overshoot a cap by a claim or two; the cap is a soft limit.
+        #
 
-    def get_next_unprocessed_event(self) -> Optional[SlackEventRecord]:
         query = """
-            SELECT
+            WITH running AS (
+                SELECT
+                    slack_integration_id,
+                    COUNT(*) AS running
+                FROM
+                    slack_event
+                WHERE
+                    processed IS NULL AND
+                    lease_expires >= NOW()
+                GROUP BY
+                    slack_integration_id
+            ),
+            account_running AS (
+                SELECT
+                    si.account_id,
+                    SUM(r.running) AS running
+                FROM
+                    running r
+                JOIN
+                    slack_integration si
+                ON
+                    si.id = r.slack_integration_id
+                GROUP BY
+                    si.account_id
+            ),
+            queued AS (
+                SELECT
+                    se.id,
+                    se.created,
+                    se.slack_integration_id,
+                    si.account_id,
+                    EXISTS (
+                        SELECT
+                            1
+                        FROM
+                            image_generation_request ir
+                        WHERE
+                            ir.slack_event_id = se.id AND
+                            ir.status <> 'error'
+                    ) AS resumed,
+                    LEAST(
+                        se.priority + COALESCE(a.priority, 0),
+                        %(resumed_priority)s - 2
+                    ) AS base_lane,
+                    FLOOR(
+                        EXTRACT(EPOCH FROM NOW() - se.created) / GREATEST(%(priority_aging_seconds)s, 1)
+                    ) AS age_boost,
+                    COALESCE(r.running, 0) AS running,
+                    GREATEST(si.weight, 1) AS weight,
+                    COALESCE(si.max_concurrency, %(workspace_concurrency)s) AS integration_cap,
+                    COALESCE(a.max_concurrency, %(account_concurrency)s) AS account_cap
+                FROM
+                    slack_event se
+                JOIN
+                    slack_integration si
+                ON
+                    si.id = se.slack_integration_id
+                LEFT JOIN
+                    account a
+                ON
+                    a.id = si.account_id
+                LEFT JOIN
+                    running r
+                ON
+                    r.slack_integration_id = se.slack_integration_id
+                WHERE
+                    se.processed IS NULL AND
+                    (se.lease_expires IS NULL OR se.lease_expires < NOW()) AND
+                    (se.not_before IS NULL OR se.not_before <= NOW())
+            ),
+            laned AS (
+                SELECT
+                    q.*,
+                    CASE
+                        WHEN q.resumed THEN %(resumed_priority)s
+                        WHEN ROW_NUMBER() OVER (
+                            PARTITION BY q.slack_integration_id, q.resumed, q.base_lane
+                            ORDER BY q.created, q.id
+                        ) = 1 THEN LEAST(q.base_lane + q.age_boost, %(resumed_priority)s - 1)
+                        ELSE q.base_lane
+                    END AS lane
+                FROM
+                    queued q
+            ),
+            slotted AS (
+                SELECT
+                    l.*,
+                    l.running + ROW_NUMBER() OVER (
+                        PARTITION BY l.slack_integration_id
+                        ORDER BY l.lane DESC, l.created, l.id
+                    ) AS integration_slot
+                FROM
+                    laned l
+            ),
+            eligible AS (
+                SELECT
+                    s.id,
+                    s.created,
+                    s.lane,
+                    s.integration_slot::FLOAT / s.weight AS virtual_finish,
+                    s.account_cap,
+                    COALESCE(ar.running, 0) + ROW_NUMBER() OVER (
+                        PARTITION BY s.account_id
+                        ORDER BY s.lane DESC, s.integration_slot::FLOAT / s.weight, s.created, s.id
+                    ) AS account_slot
+                FROM
+                    slotted s
+                LEFT JOIN
+                    account_running ar
+                ON
+                    ar.account_id = s.account_id
+                WHERE
+                    s.integration_cap <= 0 OR
+                    s.integration_slot <= s.integration_cap
+            ),
+            claimable AS (
+                SELECT
+                    se.id,
+                    e.lane,
+                    e.virtual_finish
+                FROM
+                    slack_event se
+                JOIN
+                    eligible e
+                ON
+                    e.id = se.id
+                WHERE
+                    (e.account_cap <= 0 OR e.account_slot <= e.account_cap) AND
+                    se.processed IS NULL AND
+                    (se.lease_expires IS NULL OR se.lease_expires < NOW()) AND
+                    (se.not_before IS NULL OR se.not_before <= NOW())
+                ORDER BY
+                    e.lane DESC,
+                    e.virtual_finish ASC,
+                    e.created ASC
+                LIMIT
+                    %(limit)s
+                FOR UPDATE OF se SKIP LOCKED
+            )
+            UPDATE
+                slack_event se
+            SET
+                claimed_by = %(worker_id)s,
+                lease_expires = NOW() + %(lease_seconds)s * INTERVAL '1 second'
+            FROM
+                claimable c
+            WHERE
+                se.id = c.id
+            RETURNING
                 se.id,
                 se.slack_integration_id,
-                se.event,
+                jsonb_build_object(
+                    'event', jsonb_build_object(
+                        'blocks', COALESCE(se.event->'event'->'blocks', '[]'::jsonb)
+                    )
+                ) AS event,
                 se.channel,
                 se.request_ts,
                 se.thread_ts,
-                ir.id AS image_generation_request_id,
+                (
+                    SELECT
+                        ir.id
+                    FROM
+                        image_generation_request ir
+                    WHERE
+                        ir.slack_event_id = se.id
+                    ORDER BY
+                        ir.id DESC
+                    LIMIT
+                        1
+                ) AS image_generation_request_id,
                 se.created,
-                se.processed
-            FROM
-                slack_event se
-            LEFT JOIN
-                image_generation_request ir
-            ON
-                se.id = ir.slack_event_id
-            WHERE
-                se.processed IS NULL
-            ORDER BY
-                se.created ASC
-            LIMIT
-                1
+                se.processed,
+                se.stage,
+                c.lane,
+                c.virtual_finish
         """
 
-        slack_event_record = None
+        params = {
+            "worker_id": worker_id,
+            "limit": limit,
+            "lease_seconds": lease_seconds,
+            "workspace_concurrency": workspace_concurrency,
+            "account_concurrency": account_concurrency,
+            "resumed_priority": RESUMED_PRIORITY,
+            "priority_aging_seconds": priority_aging_seconds,
+        }
+
+        claimed = []
 
         with self.context.dbh.pool.connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute(query)
+                cursor.execute(query, params)
 
                 for row in cursor:
                     slack_event_record = SlackEventRecord(
@@ -95,16 +352,48 @@ class SlackEventStore:
                         image_generation_request_id=row[6],
                         created=row[7],
                         processed=row[8],
+                        stage=row[9],
                     )
 
-        return slack_event_record
+                    claimed.append((-row[10], row[11], slack_event_record.created, slack_event_record))
+
+        #
+        # RETURNING doesn't preserve the order of the CTE, so put the batch back
+        # in claim order. The worker submits it in this order, and a resumed job
+        # or direct message shouldn't wait behind new jobs claimed alongside it.
+        #
+
+        claimed.sort(key=lambda claim: claim[:3])
+
+        return [claim[3] for claim in claimed]
+
+    def renew_leases(self, worker_id: str, slack_event_ids: List[int], lease_seconds: int):
+        if not slack_event_ids:
+            return
+
+        query = """
+            UPDATE
+                slack_event
+            SET
+                lease_expires = NOW() + %s * INTERVAL '1 second'
+            WHERE
+                id = ANY(%s) AND
+                claimed_by = %s AND
+                processed IS NULL
+        """
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (lease_seconds, slack_event_ids, worker_id))
 
     def get_image_generation_request(self, image_generation_request_id: int) -> ImageGenerationRequest:
         query = """
             SELECT
                 model_vendor,
                 job_id,
-                token
+                token,
+                status,
+                cache_key
             FROM
                 image_generation_request
             WHERE
@@ -123,6 +412,8 @@ class SlackEventStore:
                         model_vendor=row[0],
                         job_id=row[1],
                         token=row[2],
+                        status=row[3],
+                        cache_key=row[4],
                     )
 
         if not image_generation_request:
@@ -130,7 +421,172 @@ class SlackEventStore:
 
         return image_generation_request
 
-    def save_image_generation_request(self, slack_event_id: int, image_generator: ImageGenerator) -> int:
+    def get_downloaded_image_generation_request_by_cache_key(self, cache_key: str) -> Optional[ImageGenerationRequest]:
+
+        #
+        # The newest finished request for this key whose images we still have.
+        # A request is marked complete before its images are downloaded, so we
+        # check for the images themselves.
+        #
+
+        query = """
+            SELECT
+                ir.id,
+                ir.model_vendor,
+                ir.job_id,
+                ir.token,
+                ir.status,
+                ir.cache_key
+            FROM
+                image_generation_request ir
+            WHERE
+                ir.cache_key = %s AND
+                ir.status = 'complete' AND
+                EXISTS (
+                    SELECT
+                        1
+                    FROM
+                        generated_image gi
+                    WHERE
+                        gi.image_generation_request_id = ir.id AND
+                        gi.filename IS NOT NULL AND
+                        gi.evicted IS NULL
+                )
+            ORDER BY
+                ir.id DESC
+            LIMIT
+                1
+        """
+
+        return self.__get_image_generation_request(query, (cache_key,))
+
+    def get_in_flight_image_generation_request_by_cache_key(self, cache_key: str, statuses: List[str]) -> Optional[ImageGenerationRequest]:
+
+        #
+        # The newest request for this key that's still running at the vendor, or
+        # that has finished but whose event is still downloading the images.
+        # Either way, waiting on it is cheaper than starting another job.
+        #
+
+        query = """
+            SELECT
+                ir.id,
+                ir.model_vendor,
+                ir.job_id,
+                ir.token,
+                ir.status,
+                ir.cache_key
+            FROM
+                image_generation_request ir
+            JOIN
+                slack_event se
+            ON
+                se.id = ir.slack_event_id
+            WHERE
+                ir.cache_key = %s AND
+                (
+                    ir.status = ANY(%s::image_generation_status[]) OR
+                    (
+                        ir.status = 'complete' AND
+                        se.processed IS NULL AND
+                        NOT EXISTS (
+                            SELECT
+                                1
+                            FROM
+                                generated_image gi
+                            WHERE
+                                gi.image_generation_request_id = ir.id
+                        )
+                    )
+                )
+            ORDER BY
+                ir.id DESC
+            LIMIT
+                1
+        """
+
+        return self.__get_image_generation_request(query, (cache_key, statuses))
+
+    @contextmanager
+    def lock_cache_key(self, cache_key: str) -> Iterator[None]:
+
+        #
+        # Holds a session-level advisory lock on the cache key, which every worker
+        # on every host sees. It's committed straight away so the connection
+        # isn't left idle in a transaction while we wait on a vendor. If the
+        # worker dies, the lock goes with its connection.
+        #
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(hashtextextended(%s, 0))", (cache_key,))
+
+            connection.commit()
+
+            try:
+                yield
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(hashtextextended(%s, 0))", (cache_key,))
+
+    def __get_image_generation_request(self, query: str, params: tuple) -> Optional[ImageGenerationRequest]:
+        image_generation_request = None
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+
+                for row in cursor:
+                    image_generation_request = ImageGenerationRequest(
+                        id=row[0],
+                        model_vendor=row[1],
+                        job_id=row[2],
+                        token=row[3],
+                        status=row[4],
+                        cache_key=row[5],
+                    )
+
+        return image_generation_request
+
+    def get_generated_images(self, image_generation_request_id: int) -> List[GeneratedImage]:
+        query = """
+            SELECT
+                id,
+                filename,
+                sha256,
+                width,
+                height,
+                seed
+            FROM
+                generated_image
+            WHERE
+                image_generation_request_id = %s
+            ORDER BY
+                id ASC
+        """
+
+        generated_images = []
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (image_generation_request_id,))
+
+                for row in cursor:
+                    generated_image = GeneratedImage(
+                        image_id=str(row[0]),
+                        url="",
+                        filename=row[1],
+                        sha256=row[2],
+                        width=row[3],
+                        height=row[4],
+                        seed=row[5],
+                    )
+
+                    generated_images.append(generated_image)
+
+        return generated_images
+
+    def save_image_generation_request(self, slack_event_id: int, image_generator: ImageGenerator, cache_key: Optional[str] = None) -> int:
         query = """
             INSERT INTO
                 image_generation_request
@@ -141,7 +597,8 @@ class SlackEventStore:
                 job_id,
                 token,
                 status,
-                credits
+                credits,
+                cache_key
             ) VALUES (
                 %s,
                 %s,
@@ -149,6 +606,7 @@ class SlackEventStore:
                 %s,
                 %s,
                 %s,
+                %s,
                 %s
             )
             RETURNING
@@ -166,7 +624,8 @@ class SlackEventStore:
                     image_generator.id,
                     image_generator.token,
                     image_generator.status,
-                    image_generator.credits
+                    image_generator.credits,
+                    cache_key
                 ))
 
                 for row in cursor:
@@ -189,6 +648,9 @@ class SlackEventStore:
             updates.append("credits = %s")
             values.append(update.credits)
 
+        if update.status == "complete":
+            updates.append("completed = NOW()")
+
         if not updates:
             return
 
@@ -207,6 +669,37 @@ class SlackEventStore:
             with connection.cursor() as cursor:
                 cursor.execute(query, values)
 
+    def get_typical_job_seconds(self, model_vendor: ModelVendor, sample_size: int = 50) -> Optional[float]:
+        query = """
+            SELECT
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY seconds)
+            FROM (
+                SELECT
+                    EXTRACT(EPOCH FROM completed - created) AS seconds
+                FROM
+                    image_generation_request
+                WHERE
+                    model_vendor = %s AND
+                    completed IS NOT NULL
+                ORDER BY
+                    completed DESC
+                LIMIT
+                    %s
+            ) recent
+        """
+
+        job_seconds = None
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (model_vendor, sample_size))
+
+                for row in cursor:
+                    if row[0] is not None:
+                        job_seconds = float(row[0])
+
+        return job_seconds
+
     def save_generated_image(self, image_generation_request_id: int, image: GeneratedImage):
         query = """
             INSERT INTO
@@ -214,6 +707,8 @@ class SlackEventStore:
             (
                 image_generation_request_id,
                 filename,
+                sha256,
+                size,
                 width,
                 height,
                 seed
@@ -222,6 +717,8 @@ class SlackEventStore:
                 %s,
                 %s,
                 %s,
+                %s,
+                %s,
                 %s
             )
         """
@@ -231,6 +728,8 @@ class SlackEventStore:
                 cursor.execute(query, (
                     image_generation_request_id,
                     image.filename,
+                    image.sha256,
+                    image.size,
                     image.width,
                     image.height,
                     image.seed,
@@ -241,11 +740,207 @@ class SlackEventStore:
             UPDATE
                 slack_event
             SET
-                processed = NOW()
+                processed = NOW(),
+                lease_expires = NULL,
+                stage = 'processed'
+            WHERE
+                id = %s
+        """
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (slack_event_id,))
+
+    def update_event_stage(self, slack_event_id: int, stage: SlackEventStage):
+        query = """
+            UPDATE
+                slack_event
+            SET
+                stage = %s
             WHERE
                 id = %s
         """
 
         with self.context.dbh.pool.connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute(query, (slack_event_id,))
\ No newline at end of file
+                cursor.execute(query, (stage.value, slack_event_id))
+
+    def delete_generated_images(self, image_generation_request_id: int):
+        query = """
+            DELETE FROM
+                generated_image
+            WHERE
+                image_generation_request_id = %s
+        """
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (image_generation_request_id,))
+
+    def record_event_failure(self, slack_event_id: int, error: str, base_delay: int, max_delay: int) -> int:
+
+        #
+        # Release the event and hold it back for an exponentially growing delay
+        # before it can be claimed again. Returns how many times it has failed.
+        #
+
+        query = """
+            UPDATE
+                slack_event
+            SET
+                attempts = attempts + 1,
+                last_error = %s,
+                claimed_by = NULL,
+                lease_expires = NULL,
+                not_before = NOW() + LEAST(%s * POWER(2, attempts), %s) * INTERVAL '1 second'
+            WHERE
+                id = %s
+            RETURNING
+                attempts
+        """
+
+        attempts = 0
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (error, base_delay, max_delay, slack_event_id))
+
+                for row in cursor:
+                    attempts = row[0]
+
+        return attempts
+
+    def dead_letter_event(self, slack_event_id: int):
+
+        #
+        # Copy the event to the dead-letter table and take it out of the queue.
+        # Like any other processed event, it's at the processed stage. The pool
+        # commits both statements together when the connection goes back.
+        #
+
+        insert_query = """
+            INSERT INTO
+                slack_event_dead_letter
+            (
+                slack_event_id,
+                slack_integration_id,
+                image_generation_request_id,
+                event,
+                attempts,
+                error
+            )
+            SELECT
+                se.id,
+                se.slack_integration_id,
+                (
+                    SELECT
+                        ir.id
+                    FROM
+                        image_generation_request ir
+                    WHERE
+                        ir.slack_event_id = se.id
+                    ORDER BY
+                        ir.id DESC
+                    LIMIT
+                        1
+                ),
+                se.event,
+                se.attempts,
+                se.last_error
+            FROM
+                slack_event se
+            WHERE
+                se.id = %s
+        """
+
+        update_query = """
+            UPDATE
+                slack_event
+            SET
+                processed = NOW(),
+                lease_expires = NULL,
+                stage = 'processed'
+            WHERE
+                id = %s
+        """
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(insert_query, (slack_event_id,))
+                cursor.execute(update_query, (slack_event_id,))
+
+class AsyncSlackEventStore:
+
+    # Saves events from the webhook, and wakes workers when a vendor calls back.
+
+    def __init__(self, context: MueckContext):
+        self.context = context
+
+    async def save_event(self, slack_event_record: SlackEventRecord) -> Optional[SlackEventRecord]:
+
+        # Returns None if we've already saved this event.
+
+        saved = False
+
+        async with self.context.async_dbh.pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(SAVE_EVENT_QUERY, save_event_values(slack_event_record))
+
+                async for row in cursor:
+                    slack_event_record.id = row[0]
+                    slack_event_record.created = row[1]
+
+                    saved = True
+
+        return slack_event_record if saved else None
+
+    async def save_events(self, slack_event_records: List[SlackEventRecord]) -> int:
+
+        #
+        # Insert a batch of events in a single multi-row INSERT, so a burst of
+        # events costs one round trip and one commit. Returns how many were
+        # actually inserted; the rest were redeliveries.
+        #
+
+        if not slack_event_records:
+            return 0
+
+        row_placeholder = "(%s, %s, %s, %s, %s, %s, %s, %s, NOW())"
+
+        query = f"""
+            INSERT INTO
+                slack_event
+            (
+                slack_integration_id,
+                app_id,
+                slack_event_id,
+                event,
+                channel,
+                request_ts,
+                thread_ts,
+                priority,
+                created
+            ) VALUES
+                {", ".join([row_placeholder] * len(slack_event_records))}
+            ON CONFLICT (app_id, slack_event_id) DO NOTHING
+        """
+
+        values = []
+
+        for slack_event_record in slack_event_records:
+            values.extend(save_event_values(slack_event_record))
+
+        async with self.context.async_dbh.pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, values)
+
+                saved = cursor.rowcount
+
+        return saved
+
+    async def notify_vendor_callback(self, slack_event_id: int):
+
+        # Wake whichever worker is waiting on this event's job. See lib/event_listener.py.
+
+        async with self.context.async_dbh.pool.connection() as connection:
+            await connection.execute("SELECT pg_notify(%s, %s)", (VENDOR_CALLBACK_CHANNEL, str(slack_event_id)))
\ No newline at end of file
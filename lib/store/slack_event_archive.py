@@ -0,0 +1,162 @@
+import datetime
+import re
+
+from psycopg import sql
+from typing import List
+
+from lib.context import MueckContext
+
+ARCHIVE_TABLE = "slack_event_archive"
+
+class SlackEventArchiveStore:
+    def __init__(self, context: MueckContext):
+        self.context = context
+
+    def get_archivable_months(self, archive_after_days: int) -> List[datetime.date]:
+        query = """
+            SELECT DISTINCT
+                date_trunc('month', created)::DATE
+            FROM
+                slack_event
+            WHERE
+                processed < NOW() - %s * INTERVAL '1 day'
+        """
+
+        months = []
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (archive_after_days,))
+
+                for row in cursor:
+                    months.append(row[0])
+
+        return months
+
+    def create_partition(self, month: datetime.date):
+        start = month.replace(day=1)
+        end = (start + datetime.timedelta(days=32)).replace(day=1)
+
+        query = sql.SQL("""
+            CREATE TABLE IF NOT EXISTS
+                {partition}
+            PARTITION OF
+                {archive}
+            FOR VALUES FROM ({start}) TO ({end})
+        """).format(
+            partition=sql.Identifier(self.__partition_name(start)),
+            archive=sql.Identifier(ARCHIVE_TABLE),
+            start=sql.Literal(start),
+            end=sql.Literal(end),
+        )
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+
+    def archive_processed_events(self, archive_after_days: int, batch_size: int) -> int:
+
+        #
+        # Move a batch of processed events into the archive in a single statement,
+        # so an event is never in both tables or in neither.
+        #
+
+        query = """
+            WITH moved AS (
+                DELETE FROM
+                    slack_event
+                WHERE
+                    id IN (
+                        SELECT
+                            id
+                        FROM
+                            slack_event
+                        WHERE
+                            processed < NOW() - %s * INTERVAL '1 day'
+                        LIMIT
+                            %s
+                    )
+                RETURNING
+                    id,
+                    slack_integration_id,
+                    event,
+                    channel,
+                    request_ts,
+                    thread_ts,
+                    created,
+                    processed
+            )
+            INSERT INTO
+                slack_event_archive
+            (
+                id,
+                slack_integration_id,
+                event,
+                channel,
+                request_ts,
+                thread_ts,
+                created,
+                processed
+            )
+            SELECT
+                id,
+                slack_integration_id,
+                event,
+                channel,
+                request_ts,
+                thread_ts,
+                created,
+                processed
+            FROM
+                moved
+        """
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (archive_after_days, batch_size))
+
+                archived = cursor.rowcount
+
+        return archived
+
+    def drop_partitions_before(self, cutoff: datetime.date) -> List[str]:
+        query = """
+            SELECT
+                c.relname
+            FROM
+                pg_inherits i
+            JOIN
+                pg_class c ON i.inhrelid = c.oid
+            WHERE
+                i.inhparent = %s::regclass
+        """
+
+        dropped = []
+
+        with self.context.dbh.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, (ARCHIVE_TABLE,))
+
+                partitions = [row[0] for row in cursor]
+
+            for partition in partitions:
+                m = re.match(rf"^{ARCHIVE_TABLE}_(\d{{4}})_(\d{{2}})$", partition)
+
+                if not m:
+                    continue
+
+                start = datetime.date(int(m.group(1)), int(m.group(2)), 1)
+                end = (start + datetime.timedelta(days=32)).replace(day=1)
+
+                if end > cutoff:
+                    continue
+
+                with connection.cursor() as cursor:
+                    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(partition)))
+
+                dropped.append(partition)
+
+        return dropped
+
+    def __partition_name(self, month: datetime.date) -> str:
+        return f"{ARCHIVE_TABLE}_{month.year:04d}_{month.month:02d}"
\ No newline at end of file
@@ -3,6 +3,60 @@ from typing import Optional
 from lib.context import MueckContext
 from lib.models.slack_integration import SlackIntegrationFilter, SlackIntegrationRecord
 
+def build_slack_integration_query(integration_filter: SlackIntegrationFilter) -> tuple[str, list]:
+    where = []
+    values = []
+
+    if integration_filter.slack_integration_id:
+        where.append(f"id = %s")
+        values.append(integration_filter.slack_integration_id)
+
+    if integration_filter.app_id:
+        where.append(f"app_id = %s")
+        values.append(integration_filter.app_id)
+
+    query = f"""
+        SELECT
+            id,
+            account_id,
+            slack_client_id,
+            team_id,
+            team_name,
+            bot_user_id,
+            app_id,
+            access_token,
+            created
+        FROM
+            slack_integration
+        WHERE
+            {" AND ".join(where)}
+    """
+
+    return (query, values)
+
+def slack_integration_record_from_row(row) -> SlackIntegrationRecord:
+    slack_integration_id = row[0]
+    account_id = row[1]
+    slack_client_id = row[2]
+    team_id = row[3]
+    team_name = row[4]
+    bot_user_id = row[5]
+    app_id = row[6]
+    access_token = row[7]
+    created = row[8]
+
+    return SlackIntegrationRecord(
+        id=slack_integration_id,
+        account_id=account_id,
+        slack_client_id=slack_client_id,
+        team_id=team_id,
+        team_name=team_name,
+        bot_user_id=bot_user_id,
+        app_id=app_id,
+        access_token=access_token,
+        created=created
+    )
+
 class SlackIntegrationStore:
     def __init__(self, context: MueckContext):
         self.context = context
@@ -54,33 +108,7 @@ class SlackIntegrationStore:
         return integration_id
 
     def get_slack_integration(self, integration_filter: SlackIntegrationFilter) -> Optional[SlackIntegrationRecord]:
-        where = []
-        values = []
-
-        if integration_filter.slack_integration_id:
-            where.append(f"id = %s")
-            values.append(integration_filter.slack_integration_id)
-
-        if integration_filter.app_id:
-            where.append(f"app_id = %s")
-            values.append(integration_filter.app_id)
-
-        query = f"""
-            SELECT
-                id,
-                account_id,
-                slack_client_id,
-                team_id,
-                team_name,
-                bot_user_id,
-                app_id,
-                access_token,
-                created
-            FROM
-                slack_integration
-            WHERE
-                {" AND ".join(where)}
-        """
+        (query, values) = build_slack_integration_query(integration_filter)
 
         slack_integration_record = None
 
@@ -89,26 +117,27 @@ class SlackIntegrationStore:
                 cursor.execute(query, values)
 
                 for row in cursor:
-                    slack_integration_id = row[0]
-                    account_id = row[1]
-                    slack_client_id = row[2]
-                    team_id = row[3]
-                    team_name = row[4]
-                    bot_user_id = row[5]
-                    app_id = row[6]
-                    access_token = row[7]
-                    created = row[8]
-
-                    slack_integration_record = SlackIntegrationRecord(
-                        id=slack_integration_id,
-                        account_id=account_id,
-                        slack_client_id=slack_client_id,
-                        team_id=team_id,
-                        team_name=team_name,
-                        bot_user_id=bot_user_id,
-                        app_id=app_id,
-                        access_token=access_token,
-                        created=created
-                    )
+                    slack_integration_record = slack_integration_record_from_row(row)
+
+        return slack_integration_record
+
+class AsyncSlackIntegrationStore:
+
+    # Finds the integration an incoming event's app_id belongs to.
+
+    def __init__(self, context: MueckContext):
+        self.context = context
+
+    async def get_slack_integration(self, integration_filter: SlackIntegrationFilter) -> Optional[SlackIntegrationRecord]:
+        (query, values) = build_slack_integration_query(integration_filter)
+
+        slack_integration_record = None
+
+        async with self.context.async_dbh.pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, values)
+
+                async for row in cursor:
+                    slack_integration_record = slack_integration_record_from_row(row)
 
         return slack_integration_record
\ No newline at end of file
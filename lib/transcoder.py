@@ -0,0 +1,115 @@
+import json
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from lib.context import MueckContext
+from lib.models.generated_image import GeneratedImage
+
+# EXIF tag we keep the original image's text metadata (including the seed) in.
+
+EXIF_IMAGE_DESCRIPTION = 0x010E
+
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+
+def transcode_image(filename: str, output_filename: str, image_format: str, quality: int) -> str:
+
+    #
+    # Runs in a worker process. Pillow is only needed when transcoding is
+    # turned on, so it's imported here rather than at the top of the module.
+    #
+
+    from PIL import Image
+
+    if os.path.exists(output_filename):
+        return output_filename
+
+    (pil_format, _extension) = FORMATS[image_format]
+
+    with Image.open(filename) as image:
+        text = {key: value for (key, value) in image.info.items() if isinstance(value, str)}
+
+        exif = image.getexif()
+        exif[EXIF_IMAGE_DESCRIPTION] = json.dumps(text)
+
+        if pil_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        partial_filename = f"{output_filename}.part"
+
+        image.save(partial_filename, format=pil_format, quality=quality, exif=exif)
+
+    os.replace(partial_filename, output_filename)
+
+    return output_filename
+
+class ImageTranscoder:
+
+    #
+    # Re-encodes generated images into a smaller lossy format before they're
+    # uploaded to Slack. The encoding happens in a pool of processes so it doesn't
+    # compete with the worker's I/O threads for the GIL. The transcoded file sits
+    # next to the original, which is left untouched.
+    #
+
+    def __init__(self, context: MueckContext):
+        self.context = context
+
+        self.image_format = context.transcode_format
+        self.quality = context.transcode_quality
+
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        if self.enabled:
+            if self.image_format not in FORMATS:
+                raise ValueError(f"Unsupported transcode format: {self.image_format}")
+
+            #
+            # Spawn rather than fork, since the worker already has threads (and
+            # database connections) that a forked child would inherit.
+            #
+
+            self.executor = ProcessPoolExecutor(
+                max_workers=context.transcode_processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.image_format)
+
+    def output_filename(self, filename: str) -> str:
+        (_pil_format, extension) = FORMATS[self.image_format]
+        (stem, _original_extension) = os.path.splitext(filename)
+
+        return f"{stem}.q{self.quality}.{extension}"
+
+    def transcode(self, images: List[GeneratedImage]):
+
+        #
+        # Sets each image's upload_filename. If an image can't be transcoded, we
+        # upload the original instead.
+        #
+
+        futures = [
+            self.executor.submit(
+                transcode_image,
+                image.filename,
+                self.output_filename(image.filename),
+                self.image_format,
+                self.quality
+            ) for image in images
+        ]
+
+        for (image, future) in zip(images, futures):
+            try:
+                image.upload_filename = future.result()
+            except Exception as e:
+                self.context.logger.error(f"Failed to transcode filename={image.filename}: {e}", exc_info=True)
+
+                image.upload_filename = image.filename
\ No newline at end of file
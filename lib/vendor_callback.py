@@ -0,0 +1,41 @@
+import hashlib
+import hmac
+
+from typing import Optional
+
+from lib.context import MueckContext
+
+#
+# Vendors that support it call us back when a job changes state, instead of
+# waiting for us to poll. They can't sign their requests with anything of ours,
+# so the callback URL carries its own signature: an HMAC of the vendor and the
+# event ID, keyed with MUECK_CALLBACK_SECRET. A callback only tells the worker
+# to check the job now; the job's status still comes from the vendor's API, so
+# a forged or replayed callback can't do more than cause an extra status check.
+#
+
+def get_callback_url(context: MueckContext, model_vendor: str, slack_event_id: int) -> Optional[str]:
+
+    # None if callbacks aren't configured, in which case the job is only polled.
+
+    if not context.callback_secret or not context.callback_base_url:
+        return None
+
+    signature = sign_callback(context, model_vendor, slack_event_id)
+
+    return f"{context.callback_base_url}/api/v1/mueck/vendor-callback/{model_vendor}/{slack_event_id}?signature={signature}"
+
+def sign_callback(context: MueckContext, model_vendor: str, slack_event_id: int) -> str:
+    return hmac.new(
+        key=context.callback_secret.encode("utf-8"),
+        msg=f"{model_vendor}:{slack_event_id}".encode("utf-8"),
+        digestmod=hashlib.sha256
+    ).hexdigest()
+
+def verify_callback_signature(context: MueckContext, model_vendor: str, slack_event_id: int, signature: str) -> bool:
+    if not context.callback_secret:
+        return False
+
+    computed_signature = sign_callback(context, model_vendor, slack_event_id)
+
+    return hmac.compare_digest(signature, computed_signature)
\ No newline at end of file
@@ -1,18 +1,42 @@
-import json
 import os
 import uvicorn
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from typing import Any
 
 from lib.context import MueckContext
+from lib.event_buffer import SlackEventBuffer
+from lib.event_listener import NotificationListener, SLACK_INTEGRATION_CHANNEL
 from lib.slack_authorization import SlackAuthorization
 from lib.slack_event import SlackEvent
+from lib.slack_payload import parse_payload
+from lib.store.slack_event import AsyncSlackEventStore
+from lib.vendor_callback import verify_callback_signature
 
 app = FastAPI()
 
 context = MueckContext()
 
+# Keeps this process's cached integrations up to date when they change elsewhere.
+
+listener = NotificationListener(context, {
+    SLACK_INTEGRATION_CHANNEL: context.slack_cache.invalidate_integration,
+})
+
+event_buffer = SlackEventBuffer(context)
+
+@app.on_event("startup")
+async def open_database_pool():
+    await context.async_dbh.open()
+
+    listener.start()
+    event_buffer.start()
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    await event_buffer.stop()
+    await context.async_dbh.close()
+
 @app.get("/api/v1/mueck/slack-redirect-link")
 def get_slack_redirect_link(account_id: int, slack_client_id: int) -> dict:
     authorization = SlackAuthorization(context)
@@ -32,7 +56,14 @@ def get_slack_access_token(code: str, state: str) -> None:
 @app.post("/api/v1/mueck/slack-event")
 async def post_slack_event(request: Request) -> None:
     raw_payload = await request.body()
-    event_body = json.loads(raw_payload)
+    payload = raw_payload.decode()
+
+    #
+    # We only need a handful of fields from the payload here. The payload
+    # itself is saved exactly as Slack sent it.
+    #
+
+    event_body = parse_payload(raw_payload)
     event_type = event_body["type"]
 
     if event_type == "url_verification":
@@ -42,6 +73,20 @@ async def post_slack_event(request: Request) -> None:
             "challenge": challenge,
         }
 
+    #
+    # Slack redelivers an event if we don't answer quickly enough. If we've
+    # already saved it, acknowledge it without doing anything else.
+    #
+
+    app_id = event_body.get("api_app_id")
+    event_id = event_body.get("event_id")
+    retry_num = request.headers.get("X-Slack-Retry-Num")
+
+    if app_id and event_id and context.slack_cache.has_seen_event(app_id, event_id):
+        context.logger.info(f"Dropping duplicate event: app_id={app_id}, event_id={event_id}, retry_num={retry_num}")
+
+        return "", 204
+
     #
     # This will generate a Slack event without verifying the signature.
     #
@@ -56,7 +101,7 @@ async def post_slack_event(request: Request) -> None:
     slack_signature = request.headers.get("X-Slack-Signature")
     timestamp_header = request.headers.get("X-Slack-Request-Timestamp")
 
-    verification_string = f"v0:{timestamp_header}:{raw_payload.decode()}"
+    verification_string = f"v0:{timestamp_header}:{payload}"
 
     #
     # Send everything we need to verify and process the event:
@@ -64,16 +109,44 @@ async def post_slack_event(request: Request) -> None:
     # - The signature as computed by Slack
     # - Our interpretation of the verification string
     # - The event body, as a dictionary
+    # - The event body, as Slack sent it
     #
 
-    slack_event = SlackEvent.from_verified_event(
+    slack_event = await SlackEvent.from_verified_event_async(
         context,
         slack_signature,
         verification_string,
-        event_body
+        event_body,
+        payload
     )
 
-    slack_event.save_event()
+    #
+    # Queue the event to be written in the background, so we can answer Slack
+    # straight away.
+    #
+
+    saved = await event_buffer.enqueue(slack_event)
+
+    if not saved:
+        context.logger.info(f"Dropping duplicate event: app_id={app_id}, event_id={event_id}, retry_num={retry_num}")
+
+    return "", 204
+
+@app.post("/api/v1/mueck/vendor-callback/{model_vendor}/{slack_event_id}")
+async def post_vendor_callback(model_vendor: str, slack_event_id: int, signature: str = "") -> None:
+
+    #
+    # A vendor is telling us one of our jobs has changed. We don't trust what it
+    # says about the job; we just wake the worker that's waiting on it, and the
+    # worker asks the vendor for the job's status.
+    #
+
+    if not verify_callback_signature(context, model_vendor, slack_event_id, signature):
+        context.logger.error(f"Invalid callback signature: model_vendor={model_vendor}, slack_event_id={slack_event_id}")
+
+        raise HTTPException(status_code=403)
+
+    await AsyncSlackEventStore(context).notify_vendor_callback(slack_event_id)
 
     return "", 204
 
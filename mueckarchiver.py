@@ -0,0 +1,52 @@
+import datetime
+
+from lib.context import MueckContext
+from lib.store.slack_event_archive import SlackEventArchiveStore
+
+class MueckArchiver:
+
+    #
+    # Moves processed events out of slack_event into the monthly partitions of
+    # slack_event_archive, and drops archive partitions that are past retention.
+    # This is meant to be run periodically, e.g. from cron.
+    #
+
+    def __init__(self):
+        self.context = MueckContext()
+        self.store = SlackEventArchiveStore(self.context)
+
+    def run(self):
+        archive_after_days = self.context.archive_after_days
+        batch_size = self.context.archive_batch_size
+
+        for month in self.store.get_archivable_months(archive_after_days):
+            self.store.create_partition(month)
+
+        total = 0
+
+        while True:
+            archived = self.store.archive_processed_events(archive_after_days, batch_size)
+
+            total += archived
+
+            if archived < batch_size:
+                break
+
+        self.context.logger.info(f"Archived {total} processed events.")
+
+        retention_months = self.context.archive_retention_months
+
+        if not retention_months:
+            return
+
+        today = datetime.date.today()
+        months = today.year * 12 + today.month - 1 - retention_months
+        cutoff = datetime.date(months // 12, months % 12 + 1, 1)
+
+        for partition in self.store.drop_partitions_before(cutoff):
+            self.context.logger.info(f"Dropped archive partition={partition}")
+
+if __name__ == "__main__":
+    archiver = MueckArchiver()
+
+    archiver.run()
\ No newline at end of file
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import struct
+import time
+import uuid
+import uvicorn
+import zlib
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from typing import Dict
+
+from lib.http import HttpSession
+from lib.logging import setup_logger
+
+#
+# A stand-in for the TensorArt API, for trying the worker out locally without
+# spending credits. Point the worker at it with:
+#
+#   TENSORART_ENDPOINT=http://localhost:11031
+#
+# Jobs wait, run and then succeed over MUECK_STUB_JOB_SECONDS, with a single
+# one-pixel PNG as their result. If a job was created with a callbackUrl, the
+# stub calls it as soon as the job finishes, like the real vendor would.
+#
+
+app = FastAPI()
+
+logger = setup_logger()
+http = HttpSession()
+
+job_seconds = float(os.getenv("MUECK_STUB_JOB_SECONDS", "10"))
+port = int(os.getenv("MUECK_STUB_VENDOR_PORT", "11031"))
+
+jobs: Dict[str, dict] = {}
+
+def build_png() -> bytes:
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    pixels = zlib.compress(b"\x00\x80\x80\x80")
+
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", pixels) + chunk(b"IEND", b"")
+
+PNG = build_png()
+
+async def finish_job(job_id: str):
+    await asyncio.sleep(job_seconds)
+
+    job = jobs[job_id]
+    callback_url = job["callback_url"]
+
+    if not callback_url:
+        return
+
+    try:
+        r = await asyncio.to_thread(http.post, callback_url, json={"job": {"id": job_id, "status": "SUCCESS"}})
+
+        logger.info(f"Called back: job_id={job_id}, status_code={r.status_code}")
+    except Exception as e:
+        logger.error(f"Failed to call back for job_id={job_id}: {e}")
+
+@app.post("/v1/jobs")
+async def create_job(request: Request) -> dict:
+    body = await request.json()
+
+    job_id = str(uuid.uuid4().int)[:18]
+    seed = body["stages"][0]["inputInitialize"]["seed"]
+
+    jobs[job_id] = {
+        "created": time.monotonic(),
+        "seed": seed if seed >= 0 else 0,
+        "callback_url": body.get("callbackUrl"),
+    }
+
+    asyncio.create_task(finish_job(job_id))
+
+    return {
+        "job": {
+            "id": job_id,
+            "status": "CREATED",
+        }
+    }
+
+@app.get("/v1/jobs/{job_id}")
+def get_job(job_id: str, request: Request) -> dict:
+    job = jobs.get(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404)
+
+    elapsed = time.monotonic() - job["created"]
+
+    response = {
+        "id": job_id,
+        "credits": 0.0,
+    }
+
+    if elapsed < job_seconds / 2:
+        response["status"] = "WAITING"
+        response["waitingInfo"] = {
+            "queueRank": 1,
+            "queueLen": len(jobs),
+        }
+    elif elapsed < job_seconds:
+        response["status"] = "RUNNING"
+    else:
+        image_id = f"{job_id}-0"
+
+        response["status"] = "SUCCESS"
+        response["successInfo"] = {
+            "images": [
+                {
+                    "id": image_id,
+                    "url": f"{request.base_url}images/{image_id}.png",
+                },
+            ],
+            "imageExifMetaMap": {
+                image_id: {
+                    "meta": {
+                        "ImageSize": "1x1",
+                        "Seed": job["seed"],
+                    },
+                },
+            },
+        }
+
+    return {
+        "job": response,
+    }
+
+@app.get("/images/{image_id}.png")
+def get_image(image_id: str) -> Response:
+    return Response(content=PNG, media_type="image/png")
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=None, port=port)
\ No newline at end of file
@@ -1,8 +1,19 @@
+import threading
 import time
 
+from typing import Dict, Optional
+
 from lib.context import MueckContext
+from lib.event_listener import NotificationListener, SLACK_EVENT_CHANNEL, SLACK_INTEGRATION_CHANNEL, VENDOR_CALLBACK_CHANNEL
+from lib.image_evictor import ImageEvictor
+from lib.pipeline import Pipeline
+from lib.poll_scheduler import PollScheduler
 from lib.slack_event import SlackEvent
-from lib.models.generated_image import ImageGenerationRequestUpdate
+from lib.store.slack_event import SlackEventStore
+
+# How long to wait before trying again when something goes wrong in the main loop.
+
+RETRY_SECONDS = 10
 
 STATUS_MESSAGES = {
     "created": "Your request has been received.",
@@ -15,64 +26,172 @@ STATUS_MESSAGES = {
 class MueckWorker:
     def __init__(self):
         self.context = MueckContext()
+        self.concurrency = max(1, self.context.worker_concurrency)
 
-    def run(self):
-        self.context.logger.info("Mueck worker started.")
+        #
+        # Every event we're currently working on, from the moment we claim it
+        # until it's been marked as processed or has failed, wherever it is in
+        # the pipeline.
+        #
+
+        self.in_flight: Dict[int, SlackEvent] = {}
+        self.in_flight_lock = threading.Lock()
+
+        self.store = SlackEventStore(self.context)
+
+        # Set whenever there might be new work: a new event or a finished job.
+
+        self.wakeup = threading.Event()
+
+        self.listener = NotificationListener(self.context, {
+            SLACK_EVENT_CHANNEL: lambda _: self.wakeup.set(),
+            SLACK_INTEGRATION_CHANNEL: self.context.slack_cache.invalidate_integration,
+            VENDOR_CALLBACK_CHANNEL: self.__on_vendor_callback,
+        })
+
+        self.poll_scheduler = PollScheduler(self.context, self.store)
+        self.pipeline = Pipeline(self.context, self.poll_scheduler, self.__on_event_finished)
+        self.evictor = ImageEvictor(self.context)
+
+        self.lease_renewal_interval = max(1, self.context.worker_lease_seconds // 3)
+        self.last_lease_renewal = time.monotonic()
 
         # We use this so we only print the "no events to process" message once.
 
-        sleeping = False
+        self.sleeping = False
+
+    def run(self):
+        self.context.logger.info(
+            f"Mueck worker started: worker_id={self.context.worker_id}, concurrency={self.concurrency}"
+        )
+
+        self.listener.start()
+        self.pipeline.start()
+        self.evictor.start()
+
+        #
+        # A database error mustn't end the worker: everything in flight would be
+        # dropped and sit out its lease before another worker picked it up. Log
+        # it and try again shortly, renewing leases as soon as we can.
+        #
 
         while True:
-            event = SlackEvent.from_next_unprocessed(self.context)
+            try:
+                self.__claim_events()
+            except Exception as e:
+                self.context.logger.error(f"Worker loop failed: {e}", exc_info=True)
+
+                time.sleep(RETRY_SECONDS)
+
+    def __claim_events(self):
+        self.__renew_leases()
+
+        with self.in_flight_lock:
+            available = self.concurrency - len(self.in_flight)
 
-            if not event:
-                if not sleeping:
-                    self.context.logger.info("No events to process. Sleeping.")
+        if available <= 0:
+            #
+            # Every slot is busy, so wait for one of the jobs to finish
+            # before we look for more work.
+            #
 
-                    sleeping = True
+            self.__sleep(self.lease_renewal_interval)
 
-                time.sleep(10)
+            return
 
-                continue
+        events = SlackEvent.claim_unprocessed(self.context, available)
 
+        if not events:
+            if not self.sleeping:
+                self.context.logger.info("No events to process. Sleeping.")
+
+                self.sleeping = True
+
+            #
+            # New events wake us up through the listener, so this timeout is
+            # only a fallback in case we miss a notification.
+            #
+
+            self.__sleep(min(self.context.worker_poll_seconds, self.lease_renewal_interval))
+
+            return
+
+        for event in events:
             self.context.logger.info(f"Processing event_id={event.id}")
 
-            event.process_event()
+            with self.in_flight_lock:
+                self.in_flight[event.id] = event
 
-            self.__wait_for_job_completion(event)
+            self.pipeline.submit(event)
 
-            event.save_images()
-            event.reply_with_images()
-            event.mark_event_as_processed()
+        self.sleeping = False
 
-            sleeping = False
+    def __sleep(self, timeout: float):
 
-    def __wait_for_job_completion(self, event: SlackEvent):
-        model_vendor = event.image_generator.model_vendor
-        job_id = event.image_generator.id
+        #
+        # Clear the flag before we go back to the queue, not after, so that a
+        # notification that arrives while we're claiming isn't lost.
+        #
 
-        while True:
-            previous_status = event.image_generator.status
+        self.wakeup.wait(timeout)
+        self.wakeup.clear()
+
+    def __renew_leases(self):
+
+        #
+        # Jobs can run for much longer than the lease, so we keep extending the
+        # lease on everything we're still working on. If we die, the leases run out
+        # and another worker picks the events up.
+        #
+
+        now = time.monotonic()
+
+        if now - self.last_lease_renewal < self.lease_renewal_interval:
+            return
+
+        with self.in_flight_lock:
+            event_ids = list(self.in_flight.keys())
+
+        self.store.renew_leases(
+            self.context.worker_id,
+            event_ids,
+            self.context.worker_lease_seconds
+        )
+
+        # Only once it's worked, so a failed renewal is tried again on the next pass.
+
+        self.last_lease_renewal = now
+
+        self.context.logger.debug(f"in_flight={len(event_ids)}, stages={self.pipeline.get_stage_depths()}")
+
+    def __on_vendor_callback(self, payload: Optional[str]):
+        event_id = int(payload) if payload else None
+
+        self.pipeline.poll_now(event_id)
 
-            status = event.image_generator.get_status()
-            credits = event.image_generator.credits
+    def __on_event_finished(self, event: SlackEvent, exception: Optional[BaseException]):
 
-            if status != previous_status:
-                self.context.logger.info(f"job_id={job_id}, previous_status={previous_status}, status={status}")
+        #
+        # An event that failed goes back in the queue with a backoff, and to the
+        # dead-letter table once it's out of attempts, so one bad job can't be
+        # retried forever.
+        #
 
-                update = ImageGenerationRequestUpdate(
-                    status=status,
-                    credits=credits,
-                )
+        if exception:
+            self.context.logger.error(f"Failed to process event_id={event.id}, stage={event.stage.value}: {exception}", exc_info=exception)
 
-                event.reply_with_status(status)
-                event.update_image_generation_request(update)
+            try:
+                if event.record_failure(exception):
+                    self.context.logger.error(f"Giving up on event_id={event.id}; moved to the dead-letter table.")
+            except Exception as e:
+                self.context.logger.error(f"Failed to record failure for event_id={event.id}: {e}", exc_info=True)
+        else:
+            self.context.logger.info(f"Finished event_id={event.id}")
 
-                if status == "complete":
-                    return
+        with self.in_flight_lock:
+            self.in_flight.pop(event.id, None)
 
-            time.sleep(5)
+        self.wakeup.set()
 
 if __name__ == "__main__":
     worker = MueckWorker()
@@ -4,6 +4,8 @@ CREATE TABLE account (
     first_name VARCHAR(64) NOT NULL,
     last_name VARCHAR(64) NOT NULL,
     active BOOLEAN DEFAULT TRUE,
+    max_concurrency INTEGER,
+    priority INTEGER NOT NULL DEFAULT 0,
     created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -33,20 +35,65 @@ CREATE TABLE slack_integration (
     bot_user_id VARCHAR(16) NOT NULL,
     app_id VARCHAR(16) NOT NULL,
     access_token VARCHAR(128) NOT NULL,
+    weight INTEGER NOT NULL DEFAULT 1,
+    max_concurrency INTEGER,
     created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE FUNCTION notify_slack_integration_changed() RETURNS TRIGGER AS $$
+DECLARE
+    integration slack_integration;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        integration := OLD;
+    ELSE
+        integration := NEW;
+    END IF;
+
+    PERFORM pg_notify('slack_integration_changed', integration.id::TEXT || ':' || integration.app_id);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER slack_integration_changed
+    AFTER INSERT OR UPDATE OR DELETE ON slack_integration
+    FOR EACH ROW EXECUTE FUNCTION notify_slack_integration_changed();
+
+CREATE TYPE slack_event_stage AS ENUM ('claimed', 'submitted', 'completed', 'downloaded', 'uploaded', 'processed');
+
 CREATE TABLE slack_event (
     id SERIAL PRIMARY KEY,
     slack_integration_id INTEGER NOT NULL,
+    app_id VARCHAR(16),
+    slack_event_id VARCHAR(32),
     event JSONB NOT NULL,
     channel VARCHAR(32) NOT NULL,
     request_ts VARCHAR(32) NOT NULL,
     thread_ts VARCHAR(32) NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
     created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    processed TIMESTAMP
+    processed TIMESTAMP,
+    claimed_by VARCHAR(128),
+    lease_expires TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before TIMESTAMP,
+    last_error TEXT,
+    stage slack_event_stage NOT NULL DEFAULT 'claimed'
 );
 
+CREATE FUNCTION notify_slack_event_created() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('slack_event_created', NEW.id::TEXT);
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER slack_event_created
+    AFTER INSERT ON slack_event
+    FOR EACH ROW EXECUTE FUNCTION notify_slack_event_created();
+
 CREATE TYPE image_generation_model_vendor AS ENUM ('tensor_art', 'civitai');
 CREATE TYPE image_generation_status AS ENUM ('created', 'queued', 'running', 'complete', 'error');
 
@@ -59,15 +106,72 @@ CREATE TABLE image_generation_request (
     token VARCHAR(128),
     status image_generation_status NOT NULL DEFAULT 'created',
     credits DECIMAL(6, 2) NOT NULL,
-    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed TIMESTAMP,
+    cache_key CHAR(64)
 );
 
 CREATE TABLE generated_image (
     id SERIAL PRIMARY KEY,
     image_generation_request_id INTEGER NOT NULL,
-    filename VARCHAR(512) NOT NULL,
+    filename VARCHAR(512),
+    sha256 CHAR(64),
+    size BIGINT,
     width INTEGER NOT NULL,
     height INTEGER NOT NULL,
     seed NUMERIC NOT NULL,
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    evicted TIMESTAMP
+);
+
+--
+-- The worker only ever looks at unprocessed events, oldest first, so index
+-- just those. The index stays small however much history we keep.
+--
+
+CREATE UNIQUE INDEX slack_event_app_id_slack_event_id_idx ON slack_event (app_id, slack_event_id);
+CREATE INDEX slack_event_unprocessed_idx ON slack_event (created, lease_expires) WHERE processed IS NULL;
+CREATE INDEX slack_event_slack_integration_id_unprocessed_idx ON slack_event (slack_integration_id, created) WHERE processed IS NULL;
+CREATE INDEX image_generation_request_slack_event_id_idx ON image_generation_request (slack_event_id);
+CREATE INDEX image_generation_request_cache_key_idx ON image_generation_request (cache_key, status) WHERE cache_key IS NOT NULL;
+CREATE INDEX generated_image_image_generation_request_id_idx ON generated_image (image_generation_request_id);
+CREATE INDEX generated_image_sha256_idx ON generated_image (sha256);
+CREATE INDEX generated_image_filename_idx ON generated_image (filename) WHERE evicted IS NULL;
+
+--
+-- Events that failed on every attempt. They're marked processed in
+-- slack_event, and kept here so someone can look at what went wrong.
+--
+
+CREATE TABLE slack_event_dead_letter (
+    id SERIAL PRIMARY KEY,
+    slack_event_id INTEGER NOT NULL,
+    slack_integration_id INTEGER NOT NULL,
+    image_generation_request_id INTEGER,
+    event JSONB NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
     created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+CREATE INDEX slack_event_dead_letter_slack_event_id_idx ON slack_event_dead_letter (slack_event_id);
+
+--
+-- Processed events are moved here by mueckarchiver.py. Partitions are
+-- created per month as needed, and dropped once they're past retention.
+--
+
+CREATE TABLE slack_event_archive (
+    id INTEGER NOT NULL,
+    slack_integration_id INTEGER NOT NULL,
+    event JSONB NOT NULL,
+    channel VARCHAR(32) NOT NULL,
+    request_ts VARCHAR(32) NOT NULL,
+    thread_ts VARCHAR(32) NOT NULL,
+    created TIMESTAMP NOT NULL,
+    processed TIMESTAMP NOT NULL,
+    archived TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (created);
+
+CREATE INDEX slack_event_archive_id_idx ON slack_event_archive (id);
\ No newline at end of file
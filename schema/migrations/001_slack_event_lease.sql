@@ -0,0 +1,7 @@
+--
+-- Workers claim events by stamping them with their worker ID and a lease
+-- expiry. Events whose lease has expired can be claimed by another worker.
+--
+
+ALTER TABLE slack_event ADD COLUMN claimed_by VARCHAR(128);
+ALTER TABLE slack_event ADD COLUMN lease_expires TIMESTAMP;
@@ -0,0 +1,16 @@
+--
+-- Wake listening workers as soon as a new event is saved, instead of making
+-- them poll the queue.
+--
+
+CREATE FUNCTION notify_slack_event_created() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('slack_event_created', NEW.id::TEXT);
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER slack_event_created
+    AFTER INSERT ON slack_event
+    FOR EACH ROW EXECUTE FUNCTION notify_slack_event_created();
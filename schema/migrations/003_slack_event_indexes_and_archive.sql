@@ -0,0 +1,27 @@
+--
+-- The worker only ever looks at unprocessed events, oldest first, so index
+-- just those. The index stays small however much history we keep.
+--
+
+CREATE INDEX slack_event_unprocessed_idx ON slack_event (created, lease_expires) WHERE processed IS NULL;
+CREATE INDEX image_generation_request_slack_event_id_idx ON image_generation_request (slack_event_id);
+CREATE INDEX generated_image_image_generation_request_id_idx ON generated_image (image_generation_request_id);
+
+--
+-- Processed events are moved here by mueckarchiver.py. Partitions are
+-- created per month as needed, and dropped once they're past retention.
+--
+
+CREATE TABLE slack_event_archive (
+    id INTEGER NOT NULL,
+    slack_integration_id INTEGER NOT NULL,
+    event JSONB NOT NULL,
+    channel VARCHAR(32) NOT NULL,
+    request_ts VARCHAR(32) NOT NULL,
+    thread_ts VARCHAR(32) NOT NULL,
+    created TIMESTAMP NOT NULL,
+    processed TIMESTAMP NOT NULL,
+    archived TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (created);
+
+CREATE INDEX slack_event_archive_id_idx ON slack_event_archive (id);
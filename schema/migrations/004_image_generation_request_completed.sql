@@ -0,0 +1,6 @@
+--
+-- When a job completed, so the worker can learn how long each vendor's jobs
+-- usually take and schedule its status polls around that.
+--
+
+ALTER TABLE image_generation_request ADD COLUMN completed TIMESTAMP;
@@ -0,0 +1,8 @@
+--
+-- Images are stored by the SHA-256 of their contents. Every generated_image
+-- row with the same hash refers to the same file.
+--
+
+ALTER TABLE generated_image ADD COLUMN sha256 CHAR(64);
+
+CREATE INDEX generated_image_sha256_idx ON generated_image (sha256);
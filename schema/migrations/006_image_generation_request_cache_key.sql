@@ -0,0 +1,8 @@
+--
+-- Requests with an explicit seed are keyed on their prompt, seed, vendor and
+-- checkpoint, so a repeat can reuse the images or the job of an earlier one.
+--
+
+ALTER TABLE image_generation_request ADD COLUMN cache_key CHAR(64);
+
+CREATE INDEX image_generation_request_cache_key_idx ON image_generation_request (cache_key, status) WHERE cache_key IS NOT NULL;
@@ -0,0 +1,10 @@
+--
+-- Track the size and last use of every stored image, so the worker can evict
+-- the least recently used ones to stay within its disk budget.
+--
+
+ALTER TABLE generated_image ADD COLUMN size BIGINT;
+ALTER TABLE generated_image ADD COLUMN last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE generated_image ADD COLUMN evicted TIMESTAMP;
+
+CREATE INDEX generated_image_filename_idx ON generated_image (filename) WHERE evicted IS NULL;
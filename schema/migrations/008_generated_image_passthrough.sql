@@ -0,0 +1,6 @@
+--
+-- Images streamed straight to Slack in pass-through mode are never written to
+-- disk, so they have no filename.
+--
+
+ALTER TABLE generated_image ALTER COLUMN filename DROP NOT NULL;
@@ -0,0 +1,23 @@
+--
+-- Tell every process to drop an integration from its cache when it changes.
+--
+
+CREATE FUNCTION notify_slack_integration_changed() RETURNS TRIGGER AS $$
+DECLARE
+    integration slack_integration;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        integration := OLD;
+    ELSE
+        integration := NEW;
+    END IF;
+
+    PERFORM pg_notify('slack_integration_changed', integration.id::TEXT || ':' || integration.app_id);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER slack_integration_changed
+    AFTER INSERT OR UPDATE OR DELETE ON slack_integration
+    FOR EACH ROW EXECUTE FUNCTION notify_slack_integration_changed();
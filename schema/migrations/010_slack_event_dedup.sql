@@ -0,0 +1,8 @@
+--
+-- Slack's own event ID, so a redelivered event isn't saved (and generated) twice.
+--
+
+ALTER TABLE slack_event ADD COLUMN app_id VARCHAR(16);
+ALTER TABLE slack_event ADD COLUMN slack_event_id VARCHAR(32);
+
+CREATE UNIQUE INDEX slack_event_app_id_slack_event_id_idx ON slack_event (app_id, slack_event_id);
@@ -0,0 +1,11 @@
+--
+-- Weights and concurrency caps for sharing the queue fairly between
+-- workspaces. A workspace gets claims in proportion to its weight; a NULL
+-- cap falls back to the worker's default, and a cap of 0 means no limit.
+--
+
+ALTER TABLE account ADD COLUMN max_concurrency INTEGER;
+ALTER TABLE slack_integration ADD COLUMN weight INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE slack_integration ADD COLUMN max_concurrency INTEGER;
+
+CREATE INDEX slack_event_slack_integration_id_unprocessed_idx ON slack_event (slack_integration_id, created) WHERE processed IS NULL;
\ No newline at end of file
@@ -0,0 +1,8 @@
+--
+-- Priority lanes for the queue. slack_event.priority is set when the event
+-- is saved (direct messages get a boost), and account.priority lifts every
+-- event from a paid-tier account. Higher goes first.
+--
+
+ALTER TABLE account ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE slack_event ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;
\ No newline at end of file
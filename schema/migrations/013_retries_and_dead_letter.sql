@@ -0,0 +1,22 @@
+--
+-- Failed events are retried with backoff: attempts counts the failures so
+-- far, and the event isn't claimed again until not_before. Events that run
+-- out of attempts are copied to slack_event_dead_letter and marked processed.
+--
+
+ALTER TABLE slack_event ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE slack_event ADD COLUMN not_before TIMESTAMP;
+ALTER TABLE slack_event ADD COLUMN last_error TEXT;
+
+CREATE TABLE slack_event_dead_letter (
+    id SERIAL PRIMARY KEY,
+    slack_event_id INTEGER NOT NULL,
+    slack_integration_id INTEGER NOT NULL,
+    image_generation_request_id INTEGER,
+    event JSONB NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX slack_event_dead_letter_slack_event_id_idx ON slack_event_dead_letter (slack_event_id);
\ No newline at end of file
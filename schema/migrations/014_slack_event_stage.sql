@@ -0,0 +1,10 @@
+--
+-- The last pipeline stage each event finished, so a worker that picks up an
+-- event after a crash or deploy carries on from there instead of starting over.
+--
+
+CREATE TYPE slack_event_stage AS ENUM ('claimed', 'submitted', 'completed', 'downloaded', 'uploaded', 'processed');
+
+ALTER TABLE slack_event ADD COLUMN stage slack_event_stage NOT NULL DEFAULT 'claimed';
+
+UPDATE slack_event SET stage = 'processed' WHERE processed IS NOT NULL;
\ No newline at end of file